@@ -0,0 +1,113 @@
+"""
+Compare extract_heading_groups against the old find_all_next() version.
+
+Runs both on the saved pages in other_data/ and on a synthetic listing page with
+many headings, checks they return the same groups, and prints the timings.
+
+    python play_around/bench_heading_groups.py [--sections 800] [--repeat 3]
+"""
+import argparse
+import contextlib
+import io
+import re
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from page_document import PageDocument  # noqa: E402
+import scraper_gemini as sg  # noqa: E402
+
+
+def legacy_extract_heading_groups(soup, base_url):
+    """extract_heading_groups as it was before the single-pass rewrite."""
+    groups = []
+    heads = soup.find_all(["h1","h2","h3","h4"])
+
+    for h in heads:
+        title = re.sub(r"\s+"," ", h.get_text(" ", strip=True))
+        if not title:
+            continue
+
+        desc_parts = []
+        for sib in h.find_all_next():
+            if sib is h:
+                continue
+            if sib.name in ["h1","h2","h3","h4"]:
+                break
+            if sib.name in ["p","div","section","article","li"]:
+                t = re.sub(r"\s+"," ", sib.get_text(" ", strip=True))
+                if len(t) >= 40:
+                    desc_parts.append(t)
+            if len(desc_parts) >= 4:
+                break
+
+        if not desc_parts:
+            continue
+
+        full_text = title + "\n" + "\n".join(desc_parts)
+        imgs = sg.images_near_heading(h, base_url, max_siblings=8)
+        for section in sg.split_sections(full_text):
+            groups.append({"text": section, "images": imgs, "heading_element": h})
+
+    return groups[:40]
+
+
+def synthetic_page(sections: int) -> str:
+    parts = ["<html><body><main>"]
+    for i in range(sections):
+        img = f'<img src="/img/{i}.jpg">' if i % 3 == 0 else ""
+        bg = f'<div style="background-image: url(/bg/{i}.png)"></div>' if i % 7 == 0 else ""
+        parts.append(
+            f"<article><h3>Workshop {i}</h3>{img}{bg}"
+            f"<div><p>Join us for session {i} of the weekend workshop series for kids and parents.</p>"
+            f"<ul><li>Date: Saturday {i % 28 + 1} November, 10am to 12pm at the community centre</li>"
+            f"<li>Price: ${i % 50}.00 per child, siblings enjoy a discount on registration</li></ul></div>"
+            f"<footer><span>Share</span><a href='/e/{i}'>More</a></footer></article>"
+        )
+    parts.append("</main></body></html>")
+    return "".join(parts)
+
+
+def comparable(groups):
+    return [(g["text"], g["images"], id(g["heading_element"])) for g in groups]
+
+
+def bench(name, html, base_url, repeat):
+    soup = PageDocument(html, base_url).soup
+    timings = {}
+    results = {}
+    for label, fn in (("legacy", legacy_extract_heading_groups), ("linear", sg.extract_heading_groups)):
+        best = float("inf")
+        for _ in range(repeat):
+            with contextlib.redirect_stderr(io.StringIO()):
+                start = time.perf_counter()
+                results[label] = fn(soup, base_url)
+                best = min(best, time.perf_counter() - start)
+        timings[label] = best
+    same = comparable(results["legacy"]) == comparable(results["linear"])
+    speedup = timings["legacy"] / timings["linear"] if timings["linear"] else float("inf")
+    print(f"{name:<32} groups={len(results['linear']):>3}  legacy={timings['legacy']*1000:8.1f} ms  "
+          f"linear={timings['linear']*1000:8.1f} ms  x{speedup:5.1f}  {'same' if same else 'DIFFERENT'}")
+    return same
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sections", type=int, default=800, help="Headings in the synthetic page")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    ok = True
+    for path in sorted((PROJECT_ROOT / "other_data").glob("*.html")):
+        html = path.read_text(encoding="utf-8", errors="ignore")
+        ok &= bench(path.name, html, "https://example.com/", args.repeat)
+    ok &= bench(f"synthetic ({args.sections} headings)", synthetic_page(args.sections),
+                "https://example.com/", args.repeat)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
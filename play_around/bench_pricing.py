@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for pricing.extract_price against the old pattern-loop version.
+
+Texts are built from the items in valid_data/ (description, price fields, blurb
+and title joined, as the block prompts see them), plus a few long concatenated
+blocks. Both versions must return the same result for every text.
+
+    python play_around/bench_pricing.py [--repeat 5]
+"""
+import argparse
+import glob
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from pricing import extract_price, teaser_from_prices  # noqa: E402
+
+
+def legacy_extract_price(text):
+    """extract_price before the single-scan rewrite."""
+    if not text:
+        return {"price": 0.0, "price_display": "Please contact for pricing",
+                "price_display_teaser": "Contact for pricing"}
+    if re.search(r"(complimentary|free)", text, re.I):
+        return {"price": 0.0, "price_display": "Free", "price_display_teaser": "Free"}
+    if re.search(r"(contact|check website)", text, re.I):
+        return {"price": 0.0, "price_display": "Please contact for pricing",
+                "price_display_teaser": "Contact for pricing"}
+
+    text_clean = re.sub(r'\s+', ' ', text.strip())
+    price_patterns = [
+        r'(?:from\s*)?s?\$\s*(\d+(?:\.\d{1,2})?)\s*(?:-|to)\s*s?\$\s*(\d+(?:\.\d{1,2})?)',
+        r'sgd\s*(\d+(?:\.\d{1,2})?)\s*(?:-|to)\s*sgd\s*(\d+(?:\.\d{1,2})?)',
+        r'(?:from\s*)?s?\$\s*(\d+(?:\.\d{1,2})?)',
+        r'sgd\s*(\d+(?:\.\d{1,2})?)',
+        r'(\d+(?:\.\d{1,2})?)\s*sgd',
+        r'price:\s*s?\$\s*(\d+(?:\.\d{1,2})?)',
+        r'cost:\s*s?\$\s*(\d+(?:\.\d{1,2})?)',
+        r'complimentary.*(?:guests|members).*?(\d+(?:\.\d{1,2})?)',
+        r'(\d+(?:\.\d{1,2})?).*?(?:per child|per adult|per entry)',
+        r'(\d+)\s*dollars?',
+        r'complimentary|free(?: of charge| free admission)?'
+    ]
+    has_free = bool(re.search(r"(complimentary|free)", text, re.I))
+    text = text_clean.lower()
+    for pattern in price_patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            if isinstance(matches[0], tuple):
+                min_price = float(matches[0][0])
+                max_price = float(matches[0][1]) if matches[0][1] else min_price
+                return {"price": min_price, "price_display": f"S${min_price:.2f} - S${max_price:.2f}",
+                        "price_display_teaser": teaser_from_prices(min_price, max_price, has_free)}
+            price = float(matches[0])
+            return {"price": price, "price_display": f"S${price:.2f}",
+                    "price_display_teaser": teaser_from_prices(price, price, has_free)}
+    if has_free:
+        return {"price": 0.0, "price_display": "Free", "price_display_teaser": "Free"}
+    return {"price": None, "price_display": "Please contact for pricing", "price_display_teaser": "From $"}
+
+
+FIELDS = ("title", "blurb", "description", "price_display", "price_display_teaser", "datetime_display")
+
+
+def load_texts() -> list[str]:
+    texts = []
+    for path in glob.glob(str(PROJECT_ROOT / "valid_data" / "**" / "*.json"), recursive=True):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (ValueError, OSError):
+            continue
+        items = data if isinstance(data, list) else data.get("events", []) if isinstance(data, dict) else []
+        for item in items:
+            if isinstance(item, dict):
+                texts.append("\n".join(str(item.get(k) or "") for k in FIELDS))
+    # Long blocks, like candidate blocks and whole-page content
+    for i in range(0, len(texts), 25):
+        texts.append("\n".join(t for t in texts[i:i + 25] if not re.search("free|complimentary|contact", t, re.I)))
+    return texts
+
+
+def timed(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    texts = load_texts()
+    diffs = [t for t in texts if legacy_extract_price(t) != extract_price(t)]
+    for t in diffs[:5]:
+        print(f"DIFFERENT: {t[:120]!r}\n  legacy={legacy_extract_price(t)}\n  new=   {extract_price(t)}")
+
+    legacy = timed(legacy_extract_price, texts, args.repeat)
+    new = timed(extract_price, texts, args.repeat)
+    print(f"{len(texts)} texts, {len(diffs)} different")
+    print(f"legacy: {legacy*1000:8.1f} ms  ({legacy/len(texts)*1e6:6.1f} us/text)")
+    print(f"single: {new*1000:8.1f} ms  ({new/len(texts)*1e6:6.1f} us/text)  x{legacy/new:4.1f}")
+    sys.exit(1 if diffs else 0)
+
+
+if __name__ == "__main__":
+    main()
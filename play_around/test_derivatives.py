@@ -0,0 +1,41 @@
+"""
+Check that derivatives_from_file renders every configured width below the
+stored image's own, even though the JPEG is decoded at a reduced size.
+
+    python play_around/test_derivatives.py
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from image_derivatives import derivatives_from_file  # noqa: E402
+
+# (source width, configured sizes, widths expected)
+CASES = [
+    (1600, (800,), [800]),
+    (3200, (320, 800, 1600), [320, 800, 1600]),
+    (1000, (320, 800, 1600), [320, 800]),
+    (500, (800,), []),
+]
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for source_width, sizes, expected in CASES:
+            src = tmp / f"{source_width}.jpg"
+            Image.new("RGB", (source_width, source_width * 3 // 4), (40, 120, 200)).save(src, "JPEG")
+            out_base = tmp / "derived" / str(source_width)
+            derivatives = derivatives_from_file(str(src), str(out_base), sizes, ("webp", "jpeg"))
+
+            widths = sorted({d["width"] for d in derivatives})
+            assert widths == expected, f"{source_width}px with sizes={sizes}: got {widths}, expected {expected}"
+            for d in derivatives:
+                with Image.open(out_base.parent / d["filename"]) as img:
+                    assert img.size == (d["width"], d["height"]), f"{d['filename']} is {img.size}"
+            print(f"{source_width}px, sizes={sizes}: {[d['filename'].split('_')[-1] for d in derivatives]}")
+    print("All derivative checks passed")
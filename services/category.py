@@ -2,14 +2,19 @@ import os
 import requests
 from bs4 import BeautifulSoup
 from google import genai
-from playwright.sync_api import sync_playwright
 import pandas as pd
 from pathlib import Path
-import json, re
+import json, re, sys
 import time
 from urllib.parse import urlparse
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+from browser_pool import BrowserPool
+from gemini_executor import estimate_tokens
+from gemini_governor import get_governor
+
+GEMINI_MODEL = "gemini-1.5-flash"
 
 # --- Setup Gemini ---
 API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -48,28 +53,36 @@ def normalize_url(url):
         url = 'https://' + url
     return url
 
-def get_html_with_playwright(url, retries=2):
+def make_browser_pool():
+    """One headless browser reused across every account and retry."""
+    return BrowserPool(
+        size=1,
+        pages_per_context=25,
+        headless=True,
+        context_options={
+            "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            "viewport": {'width': 1920, 'height': 1080},
+        },
+    )
+
+def get_html_with_playwright(url, retries=2, pool=None):
     """Improved Playwright scraper with retries and better error handling"""
+    if pool is None:
+        with make_browser_pool() as own_pool:
+            return get_html_with_playwright(url, retries, own_pool)
+
     for attempt in range(retries):
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                context = browser.new_context(
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    viewport={'width': 1920, 'height': 1080}
-                )
-                page = context.new_page()
-                
+            with pool.page() as page:
                 # Set longer timeout and wait for network idle
                 page.goto(url, wait_until='networkidle', timeout=30000)
                 page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
                 page.wait_for_timeout(2000)
                 
                 content = page.content()
-                browser.close()
                 
-                if len(content) > 300:  # Basic validation
-                    return content
+            if len(content) > 300:  # Basic validation
+                return content
                     
         except Exception as e:
             print(f"Playwright attempt {attempt + 1} failed for {url}: {e}")
@@ -122,11 +135,11 @@ def extract_text_from_html(html_content):
     text = re.sub(r'\s+', ' ', text).strip()
     return text[:8000]
 
-def scrape_and_classify(url, max_retries=3):
+def scrape_and_classify(url, max_retries=3, pool=None):
     url = normalize_url(url)
     print(f"Processing {url}")
     
-    html_content = get_html_with_playwright(url) or get_html_with_requests(url)
+    html_content = get_html_with_playwright(url, pool=pool) or get_html_with_requests(url)
 
     # Try with www prefix if still nothing
     if not html_content:
@@ -155,17 +168,18 @@ def scrape_and_classify(url, max_retries=3):
     Respond in JSON with keys: "summary" and "category".
     """
 
-    for attempt in range(max_retries):
-        try:
-            gemini_resp = client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=prompt
-            )
-            return {"summary": gemini_resp.text, "category": None, "raw": gemini_resp.text}
-        except Exception as e:
-            print(f"Gemini API attempt {attempt+1} failed: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(3)
+    try:
+        # Shared governor: per-model rate limits, backoff on 429/5xx and a circuit breaker
+        gemini_resp = get_governor().call(
+            GEMINI_MODEL,
+            lambda: client.models.generate_content(model=GEMINI_MODEL, contents=prompt),
+            tokens=estimate_tokens(prompt),
+            # max_retries counts every attempt here; the governor counts retries after the first
+            max_retries=max_retries - 1,
+        )
+        return {"summary": gemini_resp.text, "category": None, "raw": gemini_resp.text}
+    except Exception as e:
+        print(f"Gemini API failed for {url}: {e}")
 
     return {"summary": "Classification failed", "category": "Unknown", "raw": text}
 
@@ -178,36 +192,37 @@ def main():
     results = []
     failed_urls = []
     
-    for idx, row in accounts_df.iterrows():
-        name = str(row.get("Account Name", "")).strip()
-        url = str(row.get("Website", "")).strip()
-        
-        if not url or url.lower() == "nan":
-            continue
-
-        res = scrape_and_classify(url)
-        
-        if res:
-            summary, category = parse_out(res)
-            results.append({
-                "Account Name": name,
-                "Website": url,
-                "Summary": summary,
-                "Category": category,
-                "Status": "Success"
-            })
-        else:
-            results.append({
-                "Account Name": name,
-                "Website": url,
-                "Summary": "Failed to scrape",
-                "Category": "Unknown",
-                "Status": "Failed"
-            })
-            failed_urls.append(url)
-        
-        # Rate limiting - be nice to websites
-        time.sleep(1)
+    with make_browser_pool() as pool:
+        for idx, row in accounts_df.iterrows():
+            name = str(row.get("Account Name", "")).strip()
+            url = str(row.get("Website", "")).strip()
+            
+            if not url or url.lower() == "nan":
+                continue
+
+            res = scrape_and_classify(url, pool=pool)
+            
+            if res:
+                summary, category = parse_out(res)
+                results.append({
+                    "Account Name": name,
+                    "Website": url,
+                    "Summary": summary,
+                    "Category": category,
+                    "Status": "Success"
+                })
+            else:
+                results.append({
+                    "Account Name": name,
+                    "Website": url,
+                    "Summary": "Failed to scrape",
+                    "Category": "Unknown",
+                    "Status": "Failed"
+                })
+                failed_urls.append(url)
+            
+            # Rate limiting - be nice to websites
+            time.sleep(1)
 
     output_dir = PROJECT_ROOT / "category"
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -222,6 +237,7 @@ def main():
         print(f"\nFailed URLs ({len(failed_urls)}):")
         for url in failed_urls:
             print(f"  - {url}")
+    get_governor().report()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import re
+
+# "Singapore 123456" (whitespace may include a line break, as in "<span>Singapore</span><span>123456</span>")
+_SG_POSTAL_RE = re.compile(r"Singapore\s*(\d{6})", re.I)
+# A bare 6-digit postal code in an item's own text
+_POSTAL_CODE_RE = re.compile(r"(?<!\d)(\d{6})(?!\d)")
+# How much of the line around a postal code is kept, on each side
+LINE_CONTEXT = 100
+
+
+def _window(text: str, start: int, end: int) -> tuple[int, int]:
+    """Up to LINE_CONTEXT characters either side of text[start:end], without crossing a line break."""
+    line_start = text.rfind("\n", 0, start) + 1
+    line_end = text.find("\n", end)
+    if line_end == -1:
+        line_end = len(text)
+    return max(line_start, start - LINE_CONTEXT), min(line_end, end + LINE_CONTEXT)
+
+
+def _clean(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def _postal_addresses(obj):
+    """Yield every PostalAddress-like dict in a JSON-LD object, however deeply nested."""
+    if isinstance(obj, list):
+        for x in obj:
+            yield from _postal_addresses(x)
+    elif isinstance(obj, dict):
+        types = obj.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if "PostalAddress" in types or "streetAddress" in obj or "postalCode" in obj:
+            yield obj
+        for v in obj.values():
+            if isinstance(v, (dict, list)):
+                yield from _postal_addresses(v)
+
+
+def format_postal_address(addr: dict) -> str | None:
+    """'1 Orchard Road, Singapore 238824' from a schema.org PostalAddress; None if it has no street or postcode."""
+    street = str(addr.get("streetAddress") or "").strip()
+    postal = str(addr.get("postalCode") or "").strip()
+    if not street and not postal:
+        return None
+    locality = str(addr.get("addressLocality") or "Singapore").strip()
+    tail = f"{locality} {postal}".strip()
+    if street and tail.lower() in street.lower():
+        return _clean(street)
+    return _clean(", ".join(p for p in (street, tail) if p))
+
+
+class AddressIndex:
+    def __init__(self, text: str, jsonld: list | None = None):
+        """
+        Every address a page states, found once and looked up per item.
+
+        The page text is scanned a single time for "Singapore 123456" postal codes;
+        each code maps to the text around it on its line. JSON-LD PostalAddress
+        entries are added as well, formatted as one line.
+
+        Args:
+            text: Page text, one text node per line (PageDocument.text)
+            jsonld: Parsed JSON-LD objects (PageDocument.jsonld)
+        """
+        self.by_postal = {}
+        self.structured = []
+        self.page_line = None
+
+        matches = list(_SG_POSTAL_RE.finditer(text or ""))
+        for m in matches:
+            start, end = _window(text, m.start(), m.end())
+            self.by_postal.setdefault(m.group(1), _clean(text[start:end]))
+        if matches:
+            self.page_line = self._first_line(text, matches)
+
+        for addr in _postal_addresses(jsonld or []):
+            formatted = format_postal_address(addr)
+            if not formatted:
+                continue
+            self.structured.append(formatted)
+            code = str(addr.get("postalCode") or "").strip()
+            if code:
+                self.by_postal.setdefault(code, formatted)
+
+    @staticmethod
+    def _first_line(text: str, matches) -> str:
+        # Same span a greedy re.search(r".{0,100}(Singapore\s*\d{6}).{0,100}") picks: it starts
+        # as early as the first code allows and then stretches to the last code that still fits
+        start, _ = _window(text, matches[0].start(), matches[0].end())
+        last = matches[0]
+        for m in matches[1:]:
+            if m.start() > start + LINE_CONTEXT or "\n" in text[start:m.start()]:
+                break
+            last = m
+        _, end = _window(text, last.start(), last.end())
+        return _clean(text[start:end])
+
+    @property
+    def page_address(self) -> str | None:
+        """The page's own address: its first structured address, else the first postal-code line."""
+        if self.structured:
+            return self.structured[0]
+        return self.page_line
+
+    def lookup(self, text: str) -> str | None:
+        """Page address line for the first postal code mentioned in `text`, if the page has one."""
+        for code in _POSTAL_CODE_RE.findall(text or ""):
+            if code in self.by_postal:
+                return self.by_postal[code]
+        return None
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Batch entry point for scraper_gemini: scrape every URL in a list file concurrently.
+
+    python src/async_scraper.py urls.txt --concurrency 8 --per-domain 2
+
+Pages are fetched with playwright.async_api from one shared browser; Gemini
+extraction, image download and JSON writing run in a thread pool so several
+URLs are processed at once. One JSON file is written per URL.
+"""
+import argparse
+import asyncio
+import hashlib
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+
+from page_readiness import AsyncPageReadiness
+from gemini_cache import get_gemini_cache
+from image_store import close_image_store
+from scraper_gemini import (
+    BROWSER_ARGS, USER_AGENT, OUTPUT_DIR,
+    PAGE_READY_TIMEOUT, SCROLL_READY_TIMEOUT, PAGE_FETCH_TIMEOUT,
+    PREFIX_CACHE, GOVERNOR, IMAGE_DOWNLOADER, extract_items, save_items,
+)
+
+
+def load_urls(path) -> list[str]:
+    """One URL per line; blank lines and `#` comments are skipped, duplicates dropped."""
+    urls = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if not url or url.startswith("#") or url in seen:
+                continue
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+def output_name(url: str) -> str:
+    """Readable slug of the host and path, plus a hash of the full URL so no two URLs share a file."""
+    p = urlparse(url)
+    slug = re.sub(r"[^a-zA-Z0-9]+", "_", f"{p.netloc}{p.path}").strip("_")
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+    return f"{slug[:80] or 'page'}_{digest}.json"
+
+
+class DomainLimiter:
+    def __init__(self, per_domain: int):
+        """Hands out one asyncio.Semaphore per host so no site gets more than `per_domain` pages at once."""
+        self.per_domain = per_domain
+        self._sems = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc.lower().removeprefix("www.")
+        if host not in self._sems:
+            self._sems[host] = asyncio.Semaphore(self.per_domain)
+        return self._sems[host]
+
+
+async def fetch_page_async(browser, url: str) -> tuple[str, list[dict]]:
+    """Async twin of scraper_gemini.fetch_page, run in its own browser context."""
+    context = await browser.new_context(user_agent=USER_AGENT, java_script_enabled=True)
+    try:
+        page = await context.new_page()
+        readiness = await AsyncPageReadiness.attach(page)
+        deadline = time.monotonic() + PAGE_FETCH_TIMEOUT
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        return await readiness.scroll_and_collect(deadline, PAGE_READY_TIMEOUT, SCROLL_READY_TIMEOUT)
+    finally:
+        await context.close()
+
+
+async def scrape_one(url, browser, global_sem, domain_limiter, executor, out_dir: Path) -> dict:
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    async with global_sem:
+        try:
+            async with domain_limiter(url):
+                print(f"[debug] Fetching URL: {url}", file=sys.stderr)
+                html, blocks = await fetch_page_async(browser, url)
+
+            valid = await loop.run_in_executor(executor, extract_items, url, html, blocks)
+            await loop.run_in_executor(
+                executor, save_items, valid, out_dir / output_name(url), out_dir / "images"
+            )
+            status = "ok"
+        except Exception as e:
+            print(f"Error scraping {url}: {e}", file=sys.stderr)
+            valid, status = [], f"error: {e}"
+    return {"url": url, "items": len(valid), "status": status, "seconds": round(time.monotonic() - start, 1)}
+
+
+async def run_batch(urls, concurrency=8, per_domain=2, out_dir=OUTPUT_DIR, headless=True) -> list[dict]:
+    global_sem = asyncio.Semaphore(concurrency)
+    domain_limiter = DomainLimiter(per_domain)
+    out_dir = Path(out_dir)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless, args=BROWSER_ARGS)
+            try:
+                return await asyncio.gather(*(
+                    scrape_one(url, browser, global_sem, domain_limiter, executor, out_dir)
+                    for url in urls
+                ))
+            finally:
+                await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape a list of URLs concurrently.")
+    parser.add_argument("url_file", help="text file with one URL per line")
+    parser.add_argument("--concurrency", type=int, default=8, help="URLs processed at once")
+    parser.add_argument("--per-domain", type=int, default=2, help="pages open at once per host")
+    parser.add_argument("--out-dir", default=str(OUTPUT_DIR), help="folder for the JSON files and images")
+    parser.add_argument("--headed", action="store_true", help="show the browser window")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached Gemini responses (fresh ones are still stored)")
+    args = parser.parse_args()
+    cache = get_gemini_cache()
+    cache.bypass = cache.bypass or args.no_cache
+
+    urls = load_urls(args.url_file)
+    print(f"[debug] Scraping {len(urls)} URLs (concurrency={args.concurrency}, per domain={args.per_domain})",
+          file=sys.stderr)
+    start = time.monotonic()
+    results = asyncio.run(run_batch(
+        urls, args.concurrency, args.per_domain, args.out_dir, headless=not args.headed
+    ))
+
+    for r in results:
+        print(f"{r['status']:>5}  {r['items']:>3} items  {r['seconds']:>6}s  {r['url']}")
+    ok = sum(1 for r in results if r["status"] == "ok")
+    print(f"\n{ok}/{len(results)} URLs succeeded in {time.monotonic() - start:.0f}s")
+    IMAGE_DOWNLOADER.report()
+    IMAGE_DOWNLOADER.close()
+    close_image_store()
+    get_gemini_cache().report()
+    GOVERNOR.report()
+    if PREFIX_CACHE:
+        PREFIX_CACHE.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import sys
+from contextlib import contextmanager
+from playwright.sync_api import sync_playwright
+
+
+class _ContextSlot:
+    """One browser context plus the number of pages it has served."""
+
+    def __init__(self, context):
+        self.context = context
+        self.pages_served = 0
+        self.busy = False
+
+
+class BrowserPool:
+    def __init__(self, size=2, pages_per_context=20, headless=False,
+                 launch_args=None, context_options=None):
+        """
+        Reusable Chromium instance with a small pool of browser contexts.
+
+        The browser is launched lazily on the first borrow and kept alive until
+        close(), so callers only pay the cold start once per run. Contexts are
+        recycled after `pages_per_context` pages to keep memory and cookies from
+        piling up. Playwright's sync API is not thread-safe: use one pool per thread.
+
+        Args:
+            size: Maximum number of contexts open at the same time
+            pages_per_context: Pages a context serves before it is recreated
+            headless: Launch Chromium headless
+            launch_args: Extra Chromium command-line args
+            context_options: Keyword args passed to browser.new_context()
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.pages_per_context = max(1, pages_per_context)
+        self.headless = headless
+        self.launch_args = list(launch_args or [])
+        self.context_options = dict(context_options or {})
+
+        self._playwright = None
+        self._browser = None
+        self._slots = []
+        self.launches = 0
+        self.contexts_created = 0
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+
+        # Browser died (or never started): drop every context tied to it
+        self._slots = []
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(
+            headless=self.headless, args=self.launch_args
+        )
+        self.launches += 1
+        print(f"[debug] Browser pool launched Chromium (launch #{self.launches})", file=sys.stderr)
+        return self._browser
+
+    def _new_slot(self):
+        browser = self._ensure_browser()
+        slot = _ContextSlot(browser.new_context(**self.context_options))
+        self.contexts_created += 1
+        self._slots.append(slot)
+        return slot
+
+    def _retire(self, slot):
+        try:
+            slot.context.close()
+        except Exception as e:
+            print(f"[debug] Error closing browser context: {e}", file=sys.stderr)
+        if slot in self._slots:
+            self._slots.remove(slot)
+
+    def _acquire_slot(self):
+        self._ensure_browser()
+        idle = [s for s in self._slots if not s.busy]
+        if idle:
+            # Prefer the least used context so recycling is spread out
+            return min(idle, key=lambda s: s.pages_served)
+        if len(self._slots) < self.size:
+            return self._new_slot()
+        raise RuntimeError(f"BrowserPool exhausted: all {self.size} contexts are in use")
+
+    @contextmanager
+    def page(self):
+        """Borrow a fresh page; it is closed and its context returned on exit."""
+        slot = self._acquire_slot()
+        slot.busy = True
+        page = None
+        try:
+            page = slot.context.new_page()
+            yield page
+        finally:
+            if page is not None:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+            slot.pages_served += 1
+            slot.busy = False
+            if slot.pages_served >= self.pages_per_context:
+                self._retire(slot)
+
+    def close(self):
+        """Close every context, the browser and the Playwright driver."""
+        for slot in list(self._slots):
+            self._retire(slot)
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                print(f"[debug] Error closing browser: {e}", file=sys.stderr)
+            self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                print(f"[debug] Error stopping Playwright: {e}", file=sys.stderr)
+            self._playwright = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+class GeminiCache:
+    def __init__(self, path, ttl_seconds=30 * 24 * 3600, max_bytes=500 * 1024 * 1024, bypass=False):
+        """
+        On-disk cache of Gemini response texts, keyed by model + config + prompt.
+
+        Entries older than `ttl_seconds` are treated as misses and removed. When the
+        stored responses exceed `max_bytes`, the least recently used ones are evicted.
+        With `bypass=True` lookups always miss but fresh responses are still stored,
+        which refreshes the cache.
+
+        Args:
+            path: SQLite file (created if missing)
+            ttl_seconds: Maximum age of a cached response (0 = never expires)
+            max_bytes: Size cap for all stored responses
+            bypass: Skip lookups and always call the API
+        """
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, config: dict, prompt: str) -> str:
+        payload = json.dumps({"model": model, "config": config, "prompt": prompt},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self.writes += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions}
+
+    def report(self):
+        print(f"[debug] Gemini cache: {self.hits} hits, {self.misses} misses, "
+              f"{self.writes} writes, {self.evictions} evictions", file=sys.stderr)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_gemini_cache() -> GeminiCache:
+    """
+    Process-wide response cache, opened on first use so importing the scraper creates no files.
+
+    Settings come from GEMINI_CACHE_PATH / GEMINI_CACHE_TTL / GEMINI_CACHE_MAX_MB / GEMINI_CACHE_BYPASS.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            # temperature=0.0, so the same prompt gives the same answer: re-runs on unchanged pages are free
+            _cache = GeminiCache(
+                os.getenv("GEMINI_CACHE_PATH", str(PROJECT_ROOT / ".cache" / "gemini_responses.sqlite")),
+                ttl_seconds=int(os.getenv("GEMINI_CACHE_TTL", str(30 * 24 * 3600))),
+                max_bytes=int(os.getenv("GEMINI_CACHE_MAX_MB", "500")) * 1024 * 1024,
+                bypass=os.getenv("GEMINI_CACHE_BYPASS", "") == "1",
+            )
+        return _cache
@@ -0,0 +1,102 @@
+import re
+import sys
+import threading
+import time
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+# How long to send the prefix inline after a cache creation failed for a transient reason
+CREATE_RETRY_SECONDS = 60
+_UNSUPPORTED_RE = re.compile(r"not supported|unsupported|too small|minimum", re.I)
+
+
+def caching_unsupported(error: Exception) -> bool:
+    """True when caches.create failed for good (bad request, model without caching, prefix too small)."""
+    if isinstance(error, genai_errors.ClientError) and error.code == 400:
+        return True
+    return bool(_UNSUPPORTED_RE.search(str(error)))
+
+
+class CachedPrefix:
+    def __init__(self, client, model: str, system_instruction: str, ttl_seconds: int = 3600):
+        """
+        Register a large, fixed system instruction with Gemini's cached-content API.
+
+        Requests then reference the cache by name and only send their own suffix,
+        so the instruction is neither uploaded nor billed at full input price per
+        call. If the model or account does not support caching (or the prefix is
+        under the minimum cacheable size), the instruction is sent inline as
+        `system_instruction` instead, so results are the same either way.
+
+        Args:
+            client: genai.Client
+            model: Model name the cache is created for
+            system_instruction: Prefix shared by every request
+            ttl_seconds: Lifetime of the server-side cache; it is recreated when it runs out
+        """
+        self.client = client
+        self.model = model
+        self.system_instruction = system_instruction
+        self.ttl_seconds = ttl_seconds
+        self._name = None
+        self._expires = 0.0
+        self._unsupported = False
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _cache_name(self) -> str | None:
+        with self._lock:
+            if self._unsupported:
+                return None
+            # Recreate a minute early so an in-flight request never hits an expired cache
+            if self._name and time.monotonic() < self._expires - 60:
+                return self._name
+            if time.monotonic() < self._retry_at:
+                return None
+            try:
+                cache = self.client.caches.create(
+                    model=self.model,
+                    config=genai_types.CreateCachedContentConfig(
+                        display_name="scraper-gemini-instructions",
+                        system_instruction=self.system_instruction,
+                        ttl=f"{self.ttl_seconds}s",
+                    ),
+                )
+                self._name = cache.name
+                self._expires = time.monotonic() + self.ttl_seconds
+                print(f"[debug] Created Gemini context cache {self._name}", file=sys.stderr)
+            except Exception as e:
+                self._name = None
+                if caching_unsupported(e):
+                    print(f"[debug] Gemini context caching unavailable, sending instructions inline: {e}",
+                          file=sys.stderr)
+                    self._unsupported = True
+                else:
+                    # Transient (timeout, 5xx, quota): inline for now, try creating the cache again later
+                    print(f"[debug] Could not create Gemini context cache, retrying in {CREATE_RETRY_SECONDS}s: {e}",
+                          file=sys.stderr)
+                    self._retry_at = time.monotonic() + CREATE_RETRY_SECONDS
+            return self._name
+
+    def config(self, **kwargs) -> genai_types.GenerateContentConfig:
+        """GenerateContentConfig that carries the prefix, by cache reference when possible."""
+        name = self._cache_name()
+        if name:
+            return genai_types.GenerateContentConfig(cached_content=name, **kwargs)
+        return genai_types.GenerateContentConfig(system_instruction=self.system_instruction, **kwargs)
+
+    def invalidate(self):
+        """Forget the cache (e.g. the server reports it missing); the next config() recreates it."""
+        with self._lock:
+            self._name = None
+            self._expires = 0.0
+            self._retry_at = 0.0
+
+    def close(self):
+        with self._lock:
+            if self._name:
+                try:
+                    self.client.caches.delete(name=self._name)
+                except Exception as e:
+                    print(f"[debug] Error deleting Gemini context cache: {e}", file=sys.stderr)
+            self._name = None
@@ -0,0 +1,78 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (~4 characters per token); good enough for budgeting."""
+    return max(1, len(text or "") // 4)
+
+
+class TokenBudget:
+    def __init__(self, max_tokens: int):
+        """Caps the estimated prompt tokens of all requests currently in flight."""
+        self.max_tokens = max_tokens
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: int):
+        with self._cond:
+            # A prompt bigger than the whole budget still runs, just on its own
+            while self.in_flight and self.in_flight + tokens > self.max_tokens:
+                self._cond.wait()
+            self.in_flight += tokens
+
+    def release(self, tokens: int):
+        with self._cond:
+            self.in_flight -= tokens
+            self._cond.notify_all()
+
+
+class GeminiExecutor:
+    def __init__(self, max_workers=4, max_inflight_tokens=200_000):
+        """
+        Bounded worker pool for LLM calls.
+
+        Per-minute request/token limits and retries live in gemini_governor, which
+        the called function goes through; this pool only bounds concurrency.
+
+        Args:
+            max_workers: Requests running at the same time
+            max_inflight_tokens: Estimated prompt tokens allowed in flight at once
+        """
+        self.max_workers = max_workers
+        self.budget = TokenBudget(max_inflight_tokens)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+
+    def _run(self, fn, prompt):
+        tokens = estimate_tokens(prompt)
+        self.budget.acquire(tokens)
+        try:
+            return fn(prompt)
+        finally:
+            self.budget.release(tokens)
+
+    def map(self, fn, prompts, default=None, fatal=None) -> list:
+        """
+        Call fn(prompt) for every prompt concurrently.
+
+        Results are returned in the same order as `prompts`; a call that raises
+        is logged and replaced with `default`, unless `fatal(exception)` is true,
+        in which case the exception is raised to the caller.
+        """
+        futures = [self._pool.submit(self._run, fn, p) for p in prompts]
+        results = []
+        for i, fut in enumerate(futures):
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                if fatal and fatal(e):
+                    for pending in futures[i + 1:]:
+                        pending.cancel()
+                    raise
+                print(f"[debug] Gemini call {i+1}/{len(futures)} failed: {e}", file=sys.stderr)
+                results.append(default)
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
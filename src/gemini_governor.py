@@ -0,0 +1,279 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while a model's circuit breaker is open."""
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        """Refills `per_minute` units evenly over a minute; holds at most one minute's worth."""
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 = take it now). Requests larger than capacity wait for a full bucket."""
+        now = time.monotonic()
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        # May go negative when the real usage is reported after the call; later callers wait it off
+        self.tokens -= amount
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        """
+        Opens after `failure_threshold` consecutive failures; lets one trial call through after `reset_after` s.
+
+        While that trial is in flight (half-open) every other caller is refused. Its
+        success closes the breaker, its failure opens it for another `reset_after` s.
+        Not thread-safe on its own: RateGovernor calls it under its lock.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = None
+
+    def allow(self) -> bool:
+        """Admit one call; in the half-open state only the first caller after the cool-down gets through."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self._open()
+
+    def record_inconclusive(self):
+        """The call ended without saying whether the model is healthy (throttled, bad request): free the trial slot."""
+        if self.state == self.HALF_OPEN:
+            # Back to open with the cool-down already over, so the next caller becomes the trial
+            self.state = self.OPEN
+            self.opened_at = time.monotonic() - self.reset_after
+
+
+class ModelQuota:
+    def __init__(self, rpm: int, tpm: int):
+        """Rate limits, breaker and usage counters for one model."""
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self.paused_until = 0.0
+        self.stats = {"calls": 0, "tokens": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def error_code(exc) -> int | None:
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    if code is None and response is not None:
+        code = getattr(response, "status_code", None)
+    try:
+        return int(code) if code is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc) -> bool:
+    code = error_code(exc)
+    if code is not None:
+        return code in _RETRYABLE_CODES
+    # No HTTP status: network-level failures (timeouts, resets) are worth another try
+    return isinstance(exc, (ConnectionError, TimeoutError)) or type(exc).__name__ in {
+        "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError", "ReadError",
+        "ConnectionError", "Timeout",
+    }
+
+
+def is_unavailable(exc) -> bool:
+    """The model could not be reached: its breaker is open, or a transient failure outlasted every retry."""
+    return isinstance(exc, CircuitOpenError) or is_retryable(exc)
+
+
+def retry_after_seconds(exc) -> float | None:
+    """Server-suggested delay from a Retry-After header or a google.rpc.RetryInfo detail."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    m = re.search(r"retryDelay'?\"?\s*:\s*'?\"?(\d+(?:\.\d+)?)s", str(getattr(exc, "details", "") or exc))
+    if m:
+        return float(m.group(1))
+    return None
+
+
+class RateGovernor:
+    def __init__(self, default_rpm=60, default_tpm=1_000_000, limits=None,
+                 max_retries=5, base_delay=1.0, max_delay=60.0):
+        """
+        Shared gatekeeper for Gemini calls across the whole process.
+
+        Each model gets a request bucket and a token bucket (per minute), a circuit
+        breaker and usage counters. Retryable failures (429, 5xx, timeouts) are
+        retried with full-jitter exponential backoff; a server Retry-After hint
+        overrides the backoff and pauses every caller of that model, not just the
+        one that was throttled.
+
+        Args:
+            default_rpm: Requests per minute for models without an explicit limit
+            default_tpm: Tokens per minute for models without an explicit limit
+            limits: {model: (rpm, tpm)} overrides
+            max_retries: Retries per call after the first attempt
+            base_delay: First backoff step in seconds
+            max_delay: Backoff ceiling in seconds
+        """
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.limits = dict(limits or {})
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._quotas = {}
+        self._lock = threading.Lock()
+
+    def quota(self, model: str) -> ModelQuota:
+        with self._lock:
+            if model not in self._quotas:
+                rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+                self._quotas[model] = ModelQuota(rpm, tpm)
+            return self._quotas[model]
+
+    def _acquire(self, model: str, quota: ModelQuota, tokens: int):
+        admitted = False
+        while True:
+            with self._lock:
+                # Ask the breaker once per attempt (a half-open breaker admits a single caller),
+                # but stop waiting if it opened while this caller was queued for the rate limit
+                refused = quota.breaker.state == CircuitBreaker.OPEN if admitted else not quota.breaker.allow()
+                if refused:
+                    raise CircuitOpenError(f"Circuit open for {model} after {quota.breaker.failures} failures")
+                admitted = True
+                wait = max(
+                    quota.paused_until - time.monotonic(),
+                    quota.requests.wait_time(1),
+                    quota.tokens.wait_time(tokens),
+                )
+                if wait <= 0:
+                    quota.requests.take(1)
+                    quota.tokens.take(tokens)
+                    return
+            time.sleep(min(wait, self.max_delay))
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, model: str, fn, tokens: int = 0, max_retries: int | None = None):
+        """
+        Run fn() under the model's rate limits, retrying transient failures.
+
+        If the result carries `usage_metadata.total_token_count`, the token bucket is
+        charged the real usage instead of the estimate.
+
+        Raises:
+            CircuitOpenError: the model has been failing and is cooling down
+            The last exception from fn() once retries are exhausted or it is not retryable
+        """
+        quota = self.quota(model)
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            self._acquire(model, quota, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                retryable = is_retryable(e)
+                throttled = error_code(e) == 429
+                with self._lock:
+                    if throttled:
+                        quota.stats["throttled"] += 1
+                    if retryable and not throttled:
+                        # Throttling means "slow down", not "broken": only real failures trip the breaker
+                        quota.breaker.record_failure()
+                    else:
+                        quota.breaker.record_inconclusive()
+                    if not retryable or attempt >= retries:
+                        quota.stats["failures"] += 1
+                        raise
+                    quota.stats["retries"] += 1
+                    hint = retry_after_seconds(e)
+                    delay = min(self.max_delay, hint) if hint is not None else self._backoff(attempt)
+                    if hint is not None:
+                        quota.paused_until = max(quota.paused_until, time.monotonic() + delay)
+                print(f"[debug] {model} call failed ({e.__class__.__name__}: {str(e)[:120]}), "
+                      f"retry {attempt + 1}/{retries} in {delay:.1f}s", file=sys.stderr)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            used = getattr(getattr(result, "usage_metadata", None), "total_token_count", None)
+            with self._lock:
+                quota.breaker.record_success()
+                quota.stats["calls"] += 1
+                quota.stats["tokens"] += used if used is not None else tokens
+                if used is not None:
+                    quota.tokens.take(used - tokens)
+            return result
+
+    def report(self):
+        with self._lock:
+            for model, quota in self._quotas.items():
+                s = quota.stats
+                print(f"[debug] {model}: {s['calls']} calls, {s['tokens']} tokens, {s['retries']} retries, "
+                      f"{s['throttled']} throttled, {s['failures']} failures", file=sys.stderr)
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> RateGovernor:
+    """Process-wide governor; limits come from GEMINI_RPM / GEMINI_TPM / GEMINI_MAX_RETRIES."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateGovernor(
+                default_rpm=int(os.getenv("GEMINI_RPM", "60")),
+                default_tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+                max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "5")),
+            )
+        return _governor
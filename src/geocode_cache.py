@@ -0,0 +1,178 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Returned by get() when the query has to go to the API (a cached "no result" is None)
+MISS = object()
+
+
+def normalize_query(query: str) -> str:
+    """'  Marina Square, #01-09 ' -> 'marina square 01 09': case, punctuation and spacing do not matter."""
+    return " ".join(re.sub(r"[^\w]+", " ", (query or "").lower()).split())
+
+
+class GeocodeCache:
+    def __init__(self, path, ttl_seconds=180 * 24 * 3600, negative_ttl_seconds=14 * 24 * 3600):
+        """
+        On-disk cache of Places lookups, keyed by normalized query text.
+
+        Queries that found nothing are cached too, for a shorter time, so a venue
+        name Places cannot resolve is not retried on every run.
+
+        Args:
+            path: SQLite file (created if missing)
+            ttl_seconds: Maximum age of a found place (0 = never expires)
+            negative_ttl_seconds: Maximum age of a "no result" entry (0 = never expires)
+        """
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS places ("
+            " key TEXT PRIMARY KEY, query TEXT, address TEXT, longitude REAL, latitude REAL,"
+            " found INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, query: str):
+        """
+        Cached place for `query` in the Places API shape, None if it is known to
+        have no result, or MISS if it has not been looked up (or has expired).
+        """
+        key = normalize_query(query)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT address, longitude, latitude, found, created FROM places WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                ttl = self.ttl_seconds if row[3] else self.negative_ttl_seconds
+                if ttl and time.time() - row[4] > ttl:
+                    self._db.execute("DELETE FROM places WHERE key = ?", (key,))
+                    self._db.commit()
+                    row = None
+            if row is None:
+                self.misses += 1
+                return MISS
+            self.hits += 1
+        if not row[3]:
+            return None
+        return {"formattedAddress": row[0], "location": {"longitude": row[1], "latitude": row[2]}}
+
+    def put(self, query: str, place: dict | None):
+        """Store a Places result (or None for "no result")."""
+        loc = (place or {}).get("location") or {}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO places (key, query, address, longitude, latitude, found, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (normalize_query(query), query, (place or {}).get("formattedAddress"),
+                 loc.get("longitude"), loc.get("latitude"), 1 if place else 0, time.time()),
+            )
+            self._db.commit()
+            self.writes += 1
+
+    def import_json(self, path) -> int:
+        """
+        Seed the cache from a coordinates JSON: [{address, longitude, latitude}, ...] as in
+        loc_data/coordinates.json, the [{query, address, ...}] written by export_json(), or
+        enriched events ({venue_name, address_display, ...}).
+
+        Lookups are keyed by the query sent to Places (the venue name), so each entry is
+        cached under its query / venue_name when it has one, and under its address too:
+        a venue whose name is its address then hits. Entries already cached are kept.
+        Returns the number of keys added.
+        """
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        rows = {}
+        now = time.time()
+        for e in entries if isinstance(entries, list) else []:
+            if not isinstance(e, dict) or e.get("longitude") is None or e.get("latitude") is None:
+                continue
+            address = e.get("address") or e.get("address_display")
+            for query in (e.get("query") or e.get("venue_name"), address):
+                key = normalize_query(query) if isinstance(query, str) else ""
+                if key and key not in rows:
+                    rows[key] = (key, query, address, e["longitude"], e["latitude"], 1, now)
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO places (key, query, address, longitude, latitude, found, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", list(rows.values())
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def export_json(self, path) -> int:
+        """
+        Write every found place as [{query, address, longitude, latitude}, ...], one per
+        cached query (import_json() reads it back). Returns the number written.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT query, address, longitude, latitude FROM places WHERE found = 1 ORDER BY key"
+            ).fetchall()
+        entries = [{"query": q, "address": a, "longitude": lo, "latitude": la} for q, a, lo, la in rows]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        return len(entries)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+    def report(self):
+        print(f"[debug] Geocode cache: {self.hits} hits, {self.misses} misses, {self.writes} writes",
+              file=sys.stderr)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """
+    Project-wide geocode cache, opened on first use so importing location creates no files.
+
+    Settings come from GEOCODE_CACHE_PATH / GEOCODE_CACHE_TTL / GEOCODE_CACHE_NEGATIVE_TTL.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            # Repeated venues are looked up once; venues Places cannot find are remembered for a shorter time
+            _cache = GeocodeCache(
+                os.getenv("GEOCODE_CACHE_PATH", str(PROJECT_ROOT / ".cache" / "geocode.sqlite")),
+                ttl_seconds=int(os.getenv("GEOCODE_CACHE_TTL", str(180 * 24 * 3600))),
+                negative_ttl_seconds=int(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL", str(14 * 24 * 3600))),
+            )
+        return _cache
+
+
+def close_geocode_cache():
+    """Report and close the shared cache, if this process opened it."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.report()
+            _cache.close()
+            _cache = None
@@ -0,0 +1,74 @@
+import os
+
+from PIL import Image
+
+# Pillow format name and file extension per derivative format
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg"), "jpg": ("JPEG", "jpg")}
+
+
+def parse_sizes(value: str) -> tuple[int, ...]:
+    """'320,800,1600' -> (320, 800, 1600); empty -> () (derivatives off)."""
+    return tuple(sorted({int(v) for v in value.replace(" ", "").split(",") if v}))
+
+
+def parse_formats(value: str) -> tuple[str, ...]:
+    formats = tuple(dict.fromkeys(v.strip().lower() for v in value.split(",") if v.strip()))
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        raise ValueError(f"Unsupported derivative format(s): {', '.join(unknown)}")
+    return formats
+
+
+def planned(width: int, sizes, formats) -> set[tuple[int, str]]:
+    """(width, extension) of every derivative render_derivatives() makes for an image `width` wide."""
+    return {(w, FORMATS[f][1]) for w in sizes if w < width for f in formats}
+
+
+def render_derivatives(img: Image.Image, out_base: str, sizes, formats, quality: int = 80,
+                       source_width: int | None = None) -> list[dict]:
+    """
+    Write `img` scaled to each width in `sizes`, in each of `formats`.
+
+    Sizes are made largest first, each from the previous one, so every step
+    starts from the smallest image that is still big enough. reduce() does the
+    integer part of the shrink cheaply and a LANCZOS resize finishes it. Widths
+    at or above the image's own are skipped (nothing is upscaled); `source_width`
+    is that width when `img` was decoded smaller than the original.
+
+    Returns:
+        [{"width", "height", "format", "filename"}, ...] with files at <out_base>_<width>.<ext>
+    """
+    os.makedirs(os.path.dirname(out_base), exist_ok=True)
+    img = img.convert("RGB")
+    source_width = source_width or img.width
+    derivatives = []
+    for width in sorted(sizes, reverse=True):
+        if width >= source_width:
+            continue
+        factor = img.width // width
+        if factor >= 2:
+            img = img.reduce(factor)
+        height = max(1, round(img.height * width / img.width))
+        if img.size != (width, height):
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            pil_format, ext = FORMATS[fmt]
+            path = f"{out_base}_{width}.{ext}"
+            tmp = f"{path}.{os.getpid()}.tmp"
+            img.save(tmp, format=pil_format, quality=quality)
+            os.replace(tmp, path)
+            derivatives.append({"width": width, "height": height, "format": ext,
+                                "filename": os.path.basename(path)})
+    derivatives.sort(key=lambda d: (d["width"], d["format"]))
+    return derivatives
+
+
+def derivatives_from_file(path: str, out_base: str, sizes, formats, quality: int = 80) -> list[dict]:
+    """render_derivatives() for a stored file. Runs in a worker process."""
+    with Image.open(path) as img:
+        source_width = img.width
+        if sizes:
+            # A JPEG can be decoded straight at a fraction of its size, as long as it stays at least as wide as the
+            # largest derivative; which widths to make still depends on the original width
+            img.draft("RGB", (max(sizes), max(sizes) * img.height // max(img.width, 1)))
+        return render_derivatives(img, out_base, sizes, formats, quality, source_width)
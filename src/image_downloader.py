@@ -0,0 +1,456 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageFile
+
+from image_hash import dhash_file
+from image_derivatives import FORMATS, derivatives_from_file, planned, render_derivatives
+
+CHUNK_SIZE = 64 * 1024
+# Enough of the file for any common format to state its dimensions
+PROBE_BYTES = 64 * 1024
+
+
+class ImageRejected(Exception):
+    """The probe or the download showed the URL is not worth storing (tracking pixel, SVG, too large...)."""
+
+
+def downscale_url(url: str, max_side: int) -> str:
+    """Ask an image CDN for a version no larger than `max_side` (undoes process_images' 2000px/q_100 upscaling)."""
+    if ("wixstatic.com" in url and "/v1/fill/" in url) or "cloudinary.com" in url:
+        url = re.sub(r'w_\d+,h_\d+', f'w_{max_side},h_{max_side}', url)
+        url = re.sub(r'q_100\b', 'q_85', url)
+    elif "images.unsplash.com" in url:
+        url = re.sub(r'w=\d+&h=\d+', f'w={max_side}&h={max_side}', url)
+    return url
+
+
+def convert_to_jpeg(src_path: str, dest_path: str, quality: int = 85,
+                    derived_base: str | None = None, sizes=(), formats=()) -> dict:
+    """
+    Decode a downloaded file and save it as an RGB JPEG. Runs in a worker process.
+
+    The decoded pixels are reused for the resized derivatives when `derived_base`
+    is given. The perceptual hash is taken from the saved JPEG, exactly as for
+    images stored earlier (ImageStore.dhashes), so both give the same bits.
+
+    Returns:
+        {"dhash": int, "derivatives": [...] or None if none were rendered}
+    """
+    # Written under a temporary name first: a half-written file must never look downloaded.
+    # The name comes from the (unique) source file, so two workers storing the same image never collide.
+    tmp_dest = src_path + ".jpg"
+    try:
+        with Image.open(src_path) as img:
+            rgb = img.convert("RGB")
+        rgb.save(tmp_dest, format="JPEG", quality=quality)
+        os.replace(tmp_dest, dest_path)
+        derivatives = None
+        if derived_base and sizes and formats:
+            try:
+                derivatives = render_derivatives(rgb, derived_base, sizes, formats)
+            except Exception as e:
+                # The JPEG is stored either way; ensure_derivatives() renders them on a later pass
+                print(f"[debug] Could not render derivatives for {dest_path}: {e}", file=sys.stderr)
+        return {"dhash": dhash_file(dest_path), "derivatives": derivatives}
+    except BaseException:
+        if os.path.exists(tmp_dest):
+            os.remove(tmp_dest)
+        raise
+    finally:
+        try:
+            os.remove(src_path)
+        except OSError:
+            pass
+
+
+class ImageDownloader:
+    def __init__(self, max_workers=16, per_host=4, decode_workers=None, timeout=10, quality=85,
+                 max_bytes=8 * 1024 * 1024, max_side=1600, min_side=48,
+                 derivative_sizes=(320, 800, 1600), derivative_formats=("webp", "jpeg")):
+        """
+        Concurrent image download stage.
+
+        Downloads share one pooled HTTP session and are streamed (and hashed) to a
+        temporary file in the image store, so large images never sit in memory. At most
+        `per_host` downloads run against the same host at once: the others wait in a
+        queue for that host rather than in a worker thread, so a slow host never holds
+        up downloads from other hosts. Decoding and JPEG
+        re-encoding are CPU-bound and run in a process pool, overlapping with the
+        downloads still in flight.
+
+        Before a full download each URL is probed with a HEAD and, when its headers
+        are not enough, a small ranged GET for its content type, size and
+        dimensions; a file that fits in that range is not downloaded again. SVGs, non-images and
+        tracking pixels are skipped; oversized CDN images are requested at
+        `max_side` instead; anything else still over `max_bytes` is skipped, and
+        the download itself stops if it runs past `max_bytes`.
+
+        Each stored image also gets smaller derivatives (e.g. 320/800/1600 wide in
+        WebP and JPEG) for thumbnails and cards, written from the same decode.
+
+        Args:
+            max_workers: Downloads running at the same time across all hosts
+            per_host: Downloads running at the same time against one host
+            decode_workers: Processes for decode/encode (default: CPU count)
+            timeout: Connect/read timeout per request in seconds
+            quality: JPEG quality of the saved files
+            max_bytes: Largest file that is downloaded
+            max_side: Longest side requested from image CDNs for oversized images
+            min_side: Images with a shorter side than this are skipped (pixels, spacers, icons)
+            derivative_sizes: Widths of the derivatives; empty to turn them off
+            derivative_formats: Formats of the derivatives ("webp", "jpeg")
+        """
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.decode_workers = decode_workers
+        self.timeout = timeout
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.min_side = min_side
+        self.derivative_sizes = tuple(derivative_sizes)
+        self.derivative_formats = tuple(derivative_formats)
+        self.stats = {"probed": 0, "rejected": 0, "downscaled": 0, "bytes": 0}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._host_active = {}  # host -> downloads started and not yet finished
+        self._host_waiting = {}  # host -> deque of (future, fn, args) not started yet
+        self._lock = threading.Lock()
+        self._threads = None
+        self._processes = None
+        self._storing = {}  # sha256 -> conversion in progress
+
+    def _pools(self):
+        # Started on first use so importing the scraper does not spawn processes
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="image")
+                # Workers are started fresh rather than forked from this multithreaded process
+                self._processes = ProcessPoolExecutor(max_workers=self.decode_workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+            return self._threads, self._processes
+
+    def _submit_for_host(self, url: str, fn, *args) -> Future:
+        """
+        Run fn(*args) on the thread pool once `url`'s host has a free slot.
+
+        Jobs for a busy host are queued here and started by the job that frees the
+        slot, so no worker thread ever sleeps waiting for a host.
+        """
+        host = urlparse(url).netloc.lower()
+        result = Future()
+        with self._lock:
+            start = self._host_active.get(host, 0) < self.per_host
+            if start:
+                self._host_active[host] = self._host_active.get(host, 0) + 1
+            else:
+                self._host_waiting.setdefault(host, deque()).append((result, fn, args))
+        if start:
+            self._start(host, result, fn, args)
+        return result
+
+    def _start(self, host: str, result: Future, fn, args):
+        threads = self._threads
+        if threads is None:
+            # close() was called while this job was still queued for its host
+            result.set_exception(RuntimeError("ImageDownloader is closed"))
+            return
+        try:
+            job = threads.submit(fn, *args)
+        except RuntimeError as e:
+            result.set_exception(e)
+            return
+        job.add_done_callback(lambda job: self._finished(host, result, job))
+
+    def _finished(self, host: str, result: Future, job: Future):
+        with self._lock:
+            waiting = self._host_waiting.get(host)
+            following = waiting.popleft() if waiting else None
+            if following is None:
+                # The slot stays taken when it is handed straight to the next queued job
+                self._host_active[host] -= 1
+        if following is not None:
+            self._start(host, *following)
+        if job.exception() is not None:
+            result.set_exception(job.exception())
+        else:
+            result.set_result(job.result())
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _head_decides(self, url: str, info: dict) -> bool:
+        """True when HEAD alone settles what screen() will do, so the ranged probe can be skipped."""
+        content_type = (info["content_type"] or "").split(";")[0].strip().lower()
+        if "svg" in content_type or (content_type and not content_type.startswith("image/")
+                                     and content_type != "application/octet-stream"):
+            return True
+        size = info["size"]
+        if size is None:
+            return False
+        if size > self.max_bytes:
+            return True
+        # A file bigger than the probe is no tracking pixel, so only a CDN rendition could change the outcome
+        return size > PROBE_BYTES and downscale_url(url, self.max_side) == url
+
+    def probe(self, url: str) -> dict:
+        """
+        Content type, size and dimensions of an image without downloading it.
+
+        Uses HEAD for the headers and, unless they already decide the outcome, a
+        ranged GET of the first PROBE_BYTES for the dimensions. When that range
+        turns out to hold the whole file it is kept as `body`, so small images are
+        downloaded once. Anything the server does not reveal is left as None.
+        """
+        info = {"content_type": None, "size": None, "width": None, "height": None, "body": None}
+        self._count("probed")
+        try:
+            r = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+            if r.ok:
+                info["content_type"] = r.headers.get("Content-Type")
+                length = r.headers.get("Content-Length", "")
+                info["size"] = int(length) if length.isdigit() else None
+        except requests.RequestException:
+            pass
+        if self._head_decides(url, info):
+            return info
+
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True,
+                                  headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}) as r:
+                if not r.ok:
+                    return info
+                info["content_type"] = info["content_type"] or r.headers.get("Content-Type")
+                total = r.headers.get("Content-Range", "").rpartition("/")[2]
+                length = r.headers.get("Content-Length", "")
+                if total.isdigit():
+                    info["size"] = info["size"] or int(total)
+                elif r.status_code == 200 and length.isdigit():
+                    info["size"] = info["size"] or int(length)
+                # Read on past the header only while the whole file may still fit in the probe
+                may_be_whole = info["size"] is None or info["size"] <= PROBE_BYTES
+                parser = ImageFile.Parser()
+                chunks = []
+                read = 0
+                finished = True
+                # A server that ignores Range sends the whole body: stop reading after the probe size
+                for chunk in r.iter_content(8192):
+                    parser.feed(chunk)
+                    chunks.append(chunk)
+                    read += len(chunk)
+                    if read >= PROBE_BYTES or (parser.image and not may_be_whole):
+                        finished = False
+                        break
+                if parser.image:
+                    info["width"], info["height"] = parser.image.size
+                whole = read < PROBE_BYTES or (info["size"] is not None and read == info["size"])
+                if finished and whole and r.status_code in (200, 206) and (info["size"] in (None, read)):
+                    info["body"] = b"".join(chunks)
+                    info["size"] = read
+        except (requests.RequestException, OSError, ValueError):
+            pass
+        return info
+
+    def screen(self, url: str) -> tuple[str, bytes | None]:
+        """
+        Probe `url` and decide what to download.
+
+        Returns:
+            (URL to download: itself or a smaller CDN rendition,
+             the complete file if the probe already read all of it, else None)
+
+        Raises:
+            ImageRejected: the probe shows an image that should not be stored
+        """
+        info = self.probe(url)
+        content_type = (info["content_type"] or "").split(";")[0].strip().lower()
+        if "svg" in content_type or urlparse(url).path.lower().endswith(".svg"):
+            raise ImageRejected("SVG")
+        if content_type and not content_type.startswith("image/") and content_type != "application/octet-stream":
+            raise ImageRejected(f"not an image ({content_type})")
+        if info["width"] and info["height"] and min(info["width"], info["height"]) < self.min_side:
+            raise ImageRejected(f"too small ({info['width']}x{info['height']})")
+
+        too_big = (info["size"] or 0) > self.max_bytes
+        too_wide = max(info["width"] or 0, info["height"] or 0) > self.max_side
+        if too_big or too_wide:
+            smaller = downscale_url(url, self.max_side)
+            if smaller != url:
+                self._count("downscaled")
+                return smaller, None
+            if too_big:
+                raise ImageRejected(f"too large ({info['size'] // 1024} KB)")
+        return url, info["body"]
+
+    def _save(self, chunks, dest_dir) -> tuple[str, str]:
+        """Write `chunks` to a temporary file in `dest_dir`, stopping past max_bytes; returns (path, sha256)."""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+        try:
+            written = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    written += len(chunk)
+                    if written > self.max_bytes:
+                        raise ImageRejected(f"larger than {self.max_bytes // 1024} KB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            self._count("bytes", written)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest()
+
+    def fetch(self, url: str, dest_dir) -> tuple[str, str]:
+        """Stream `url` into a temporary file in `dest_dir`; returns (path, sha256 of the bytes)."""
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            return self._save(response.iter_content(CHUNK_SIZE), dest_dir)
+
+    def _fetch_into_store(self, url: str, store):
+        download_url, body = self.screen(url)
+        if body is not None:
+            # The probe already read the whole file
+            tmp_path, sha256 = self._save([body], store.tmp_dir)
+        else:
+            tmp_path, sha256 = self.fetch(download_url, store.tmp_dir)
+        with self._lock:
+            # Same bytes as an image already stored or being stored (another URL, an earlier run)
+            pending = self._storing.get(sha256)
+            if pending is not None or store.has_blob(sha256):
+                os.remove(tmp_path)
+                return sha256, pending, False
+            if self._processes is None:
+                os.remove(tmp_path)
+                raise RuntimeError("ImageDownloader is closed")
+            dest = store.blob_path(sha256)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            converting = self._processes.submit(
+                convert_to_jpeg, tmp_path, str(dest), self.quality,
+                str(store.derived_base(sha256)), self.derivative_sizes, self.derivative_formats,
+            )
+            self._storing[sha256] = converting
+        converting.add_done_callback(lambda _: self._forget(sha256))
+        return sha256, converting, True
+
+    def _forget(self, sha256: str):
+        with self._lock:
+            self._storing.pop(sha256, None)
+
+    def download_all(self, urls: list[str], store) -> dict[str, str | None]:
+        """
+        Download every URL into `store` (an ImageStore), each one once.
+
+        Returns:
+            {url: sha256 of the stored image, or None if it failed}
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        self._pools()
+        # The probe and the download of a URL run in one slot of its host
+        fetches = {url: self._submit_for_host(url, self._fetch_into_store, url, store) for url in urls}
+        results = {}
+        for url in urls:
+            try:
+                sha256, converting, new_blob = fetches[url].result()
+                stored = converting.result() if converting is not None else {}
+                if new_blob:
+                    store.record(url, sha256, True, stored["dhash"], stored["derivatives"])
+                else:
+                    store.record(url, sha256, False)
+                results[url] = sha256
+            except ImageRejected as e:
+                self._count("rejected")
+                print(f"[debug] Skipped image {url}: {e}", file=sys.stderr)
+                results[url] = None
+            except Exception as e:
+                print(f"[debug] Image download failed for {url}: {e}", file=sys.stderr)
+                results[url] = None
+        return results
+
+    def ensure_derivatives(self, hashes, store) -> dict[str, list]:
+        """
+        Derivatives of every stored image in `hashes`, rendering those that are missing.
+
+        An image is missing derivatives when it has none yet (stored before they
+        were configured, or rendering failed) or when IMAGE_DERIVATIVE_SIZES /
+        FORMATS now ask for ones it was not given. Only the missing widths are
+        rendered, from the stored JPEG, in the process pool.
+
+        Returns:
+            {sha256: [{"width", "height", "format", "filename"}, ...]} with the configured derivatives
+        """
+        if not self.derivative_sizes or not self.derivative_formats:
+            return {}
+        known = store.derivatives(hashes)
+        jobs = {}
+        processes = None
+        for sha, derivs in known.items():
+            widths = self._missing_widths(store, sha, derivs or [])
+            if widths:
+                if processes is None:
+                    _, processes = self._pools()
+                jobs[sha] = processes.submit(
+                    derivatives_from_file, str(store.blob_path(sha)), str(store.derived_base(sha)),
+                    widths, self.derivative_formats,
+                )
+        for sha, job in jobs.items():
+            try:
+                rendered = job.result()
+            except Exception as e:
+                print(f"[debug] Could not render derivatives for {sha}: {e}", file=sys.stderr)
+                continue
+            # Re-rendered widths replace what was stored for them; derivatives no longer configured are kept on disk
+            redone = {(d["width"], d["format"]) for d in rendered}
+            kept = [d for d in known[sha] or [] if (d["width"], d["format"]) not in redone]
+            known[sha] = sorted(kept + rendered, key=lambda d: (d["width"], d["format"]))
+            store.save_derivatives(sha, known[sha])
+
+        wanted = {FORMATS[f][1] for f in self.derivative_formats}
+        sizes = set(self.derivative_sizes)
+        return {sha: [d for d in derivs if d["width"] in sizes and d["format"] in wanted]
+                for sha, derivs in known.items() if derivs is not None}
+
+    def _missing_widths(self, store, sha256: str, derivatives: list) -> tuple[int, ...]:
+        """Configured widths the stored image should have a derivative for but does not."""
+        have = {(d["width"], d["format"]) for d in derivatives}
+        # Every configured derivative already there: no need to look at the image
+        if planned(float("inf"), self.derivative_sizes, self.derivative_formats) <= have or not store.has_blob(sha256):
+            return ()
+        try:
+            # Only the header is read: widths at or above the image's own are never rendered
+            with Image.open(store.blob_path(sha256)) as img:
+                width = img.width
+        except OSError:
+            return ()
+        return tuple(sorted({w for w, _ in planned(width, self.derivative_sizes, self.derivative_formats) - have}))
+
+    def report(self):
+        s = self.stats
+        print(f"[debug] Images: {s['probed']} probed, {s['rejected']} skipped, {s['downscaled']} requested smaller, "
+              f"{s['bytes'] / 1024 / 1024:.1f} MB downloaded", file=sys.stderr)
+
+    def close(self):
+        with self._lock:
+            threads, processes = self._threads, self._processes
+            self._threads = self._processes = None
+        # Shut down outside the lock: the callbacks of jobs still in flight take it
+        if threads is not None:
+            threads.shutdown(wait=True)
+            processes.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,69 @@
+import numpy as np
+from PIL import Image
+
+# Hashes at most this many bits apart are treated as the same picture
+NEAR_DUPLICATE_BITS = 6
+
+
+def dhash_image(img: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: is each pixel brighter than its right neighbour, on a 9x8 grey thumbnail."""
+    # JPEG decoding can skip straight to a reduced scale; the thumbnail is tiny anyway
+    img.draft("L", (size * 8, size * 8))
+    small = np.asarray(img.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def dhash_file(path) -> int:
+    with Image.open(path) as img:
+        return dhash_image(img)
+
+
+def hamming_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Bit distance between every hash in `a` and every hash in `b` (uint64 arrays) -> len(a) x len(b)."""
+    return np.bitwise_count(a[:, None] ^ b[None, :])
+
+
+def near_matches(queries, hashes, max_distance: int = NEAR_DUPLICATE_BITS, chunk: int = 256) -> list[np.ndarray]:
+    """For each query hash, the indices of the hashes within `max_distance` bits of it (chunked like below)."""
+    queries = np.asarray(queries, dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    matches = []
+    for start in range(0, len(queries), chunk):
+        block = hamming_matrix(queries[start:start + chunk], hashes) <= max_distance
+        matches.extend(np.flatnonzero(row) for row in block)
+    return matches
+
+
+def near_duplicate_groups(hashes, max_distance: int = NEAR_DUPLICATE_BITS, chunk: int = 2048) -> np.ndarray:
+    """
+    Group hashes that are within `max_distance` bits of each other (transitively).
+
+    Compares all pairs in chunks of `chunk` rows, so thousands of images take a
+    few vectorised passes and memory stays at chunk x len(hashes).
+
+    Returns:
+        One label per hash: the index of the first hash in its group
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for start in range(0, n, chunk):
+        block = hamming_matrix(hashes[start:start + chunk], hashes)
+        rows, cols = np.nonzero(block <= max_distance)
+        rows += start
+        # Each pair once
+        keep = cols > rows
+        for i, j in zip(rows[keep], cols[keep]):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
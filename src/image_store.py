@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from image_hash import dhash_file
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+# SQLite integers are signed 64-bit; hashes are stored as their two's-complement value
+def _to_sqlite(h: int) -> int:
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _from_sqlite(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+class ImageStore:
+    def __init__(self, root):
+        """
+        Content-addressed store for downloaded images, shared by every run.
+
+        Each image is saved once as blobs/<ab>/<sha256>.jpg, where the hash is
+        taken over the downloaded bytes, so the same picture found under several
+        URLs or on several items is stored a single time. An SQLite index maps
+        source URLs to hashes, so a URL seen in an earlier run is not downloaded
+        again.
+
+        Args:
+            root: Store folder (created if missing)
+        """
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.stored = 0
+        self.duplicates = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root / "index.sqlite", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, fetched REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS urls_sha256 ON urls(sha256)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, dhash INTEGER, derivatives TEXT)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}
+        if "derivatives" not in columns:
+            self._db.execute("ALTER TABLE blobs ADD COLUMN derivatives TEXT")
+        # Which venues each stored image has been used for, across every run
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS venues (sha256 TEXT NOT NULL, venue TEXT NOT NULL, PRIMARY KEY (sha256, venue))"
+        )
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Early hashes were taken from the source pixels, not the stored JPEG: recompute them on demand
+            self._db.execute("UPDATE blobs SET dhash = NULL")
+            self._db.execute("PRAGMA user_version = 1")
+        self._db.commit()
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / "blobs" / sha256[:2] / f"{sha256}.jpg"
+
+    def derived_base(self, sha256: str) -> Path:
+        """Derivatives of a blob are derived/<ab>/<sha256>_<width>.<ext>."""
+        return self.root / "derived" / sha256[:2] / sha256
+
+    def has_blob(self, sha256: str) -> bool:
+        return self.blob_path(sha256).exists()
+
+    def lookup(self, url: str) -> str | None:
+        """Hash of the image already stored for `url`, or None if it has to be downloaded."""
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM urls WHERE url = ?", (url,)).fetchone()
+        if row and self.has_blob(row[0]):
+            self.hits += 1
+            return row[0]
+        return None
+
+    def record(self, url: str, sha256: str, new_blob: bool, dhash: int | None = None,
+               derivatives: list | None = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, fetched) VALUES (?, ?, ?)",
+                (url, sha256, time.time()),
+            )
+            if dhash is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, dhash, derivatives) VALUES (?, ?, ?)",
+                    (sha256, _to_sqlite(dhash), json.dumps(derivatives) if derivatives is not None else None),
+                )
+            self._db.commit()
+            if new_blob:
+                self.stored += 1
+            else:
+                self.duplicates += 1
+
+    def dhashes(self, hashes) -> dict[str, int]:
+        """Perceptual hash (image_hash.dhash_file) of each stored blob; computed and saved if missing."""
+        hashes = list(dict.fromkeys(hashes))
+        known = {}
+        with self._lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                known.update(self._db.execute(
+                    f"SELECT sha256, dhash FROM blobs WHERE sha256 IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        result = {sha: _from_sqlite(h) for sha, h in known.items() if h is not None}
+        computed = []
+        for sha in hashes:
+            if sha not in result and self.has_blob(sha):
+                try:
+                    result[sha] = dhash_file(self.blob_path(sha))
+                except OSError as e:
+                    print(f"[debug] Could not hash stored image {sha}: {e}", file=sys.stderr)
+                    continue
+                computed.append((sha, _to_sqlite(result[sha])))
+        if computed:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT INTO blobs (sha256, dhash) VALUES (?, ?)"
+                    " ON CONFLICT(sha256) DO UPDATE SET dhash = excluded.dhash", computed
+                )
+                self._db.commit()
+        return result
+
+    def all_dhashes(self) -> tuple[list[str], np.ndarray]:
+        """Every stored image with its perceptual hash: (sha256 list, matching uint64 array)."""
+        with self._lock:
+            unhashed = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT sha256 FROM urls WHERE sha256 NOT IN (SELECT sha256 FROM blobs WHERE dhash IS NOT NULL)"
+            )]
+        if unhashed:
+            # Images stored before hashes were kept (or whose hash was reset): hashed once, then saved
+            self.dhashes(unhashed)
+        with self._lock:
+            rows = self._db.execute("SELECT sha256, dhash FROM blobs WHERE dhash IS NOT NULL").fetchall()
+        return [sha for sha, _ in rows], np.array([_from_sqlite(h) for _, h in rows], dtype=np.uint64)
+
+    def record_venues(self, uses):
+        """Remember that each (sha256, venue) pair was seen; pairs already known are ignored."""
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO venues (sha256, venue) VALUES (?, ?)", list(uses))
+            self._db.commit()
+
+    def venues(self, hashes) -> dict[str, set[str]]:
+        """Every venue recorded for each of `hashes`, in any run."""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                for sha, venue in self._db.execute(
+                    f"SELECT sha256, venue FROM venues WHERE sha256 IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    found.setdefault(sha, set()).add(venue)
+        return found
+
+    def derivatives(self, hashes) -> dict[str, list | None]:
+        """Recorded derivatives per blob; None for blobs that have none yet."""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                found.update(self._db.execute(
+                    f"SELECT sha256, derivatives FROM blobs WHERE sha256 IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return {sha: json.loads(found[sha]) if found.get(sha) else None for sha in hashes}
+
+    def save_derivatives(self, sha256: str, derivatives: list):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO blobs (sha256, derivatives) VALUES (?, ?)"
+                " ON CONFLICT(sha256) DO UPDATE SET derivatives = excluded.derivatives",
+                (sha256, json.dumps(derivatives)),
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _link_file(src: Path, dest: Path):
+        if dest.exists():
+            return
+        try:
+            os.link(src, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(src, dest)
+
+    def link(self, sha256: str, dest_dir) -> Path:
+        """
+        Make the blob available as <dest_dir>/<sha256>.jpg (hard link, copy across filesystems).
+
+        Keeps each run's image folder self-contained without storing the bytes twice.
+        """
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        dest = dest_dir / f"{sha256}.jpg"
+        self._link_file(self.blob_path(sha256), dest)
+        return dest
+
+    def link_derivatives(self, sha256: str, derivatives: list, dest_dir) -> list[dict]:
+        """link() for each derivative; returns the derivative entries with their local_path."""
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        linked = []
+        for d in derivatives:
+            src = self.derived_base(sha256).parent / d["filename"]
+            if not src.exists():
+                continue
+            dest = dest_dir / d["filename"]
+            self._link_file(src, dest)
+            linked.append({**d, "local_path": str(dest)})
+        return linked
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "stored": self.stored, "duplicates": self.duplicates}
+
+    def report(self):
+        print(f"[debug] Image store: {self.hits} URLs already stored, {self.stored} new images, "
+              f"{self.duplicates} downloads matched a stored image", file=sys.stderr)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """Project-wide store (IMAGE_STORE_PATH, default valid_data/image_store), opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            # Every image is stored once for the whole project, keyed by the hash of its bytes
+            _store = ImageStore(os.getenv("IMAGE_STORE_PATH", str(PROJECT_ROOT / "valid_data" / "image_store")))
+        return _store
+
+
+def close_image_store():
+    """Report and close the shared store, if this process opened it."""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.report()
+            _store.close()
+            _store = None
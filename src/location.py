@@ -4,19 +4,65 @@ import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
 import re
-
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable not found")
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from geocode_cache import MISS, get_geocode_cache, close_geocode_cache, normalize_query
+from postal_index import PostalIndex, seed_records
 
 GOOGLE_PLACES_SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DISTRICTS_GEOJSON = PROJECT_ROOT/"config"/"districts.geojson"
+# Built from DISTRICTS_GEOJSON by build_districts(); not committed, rebuilt when missing or older than the GeoJSON
+DISTRICTS_ARTIFACT = Path(os.getenv("DISTRICTS_ARTIFACT", str(PROJECT_ROOT/".cache"/"districts.parquet")))
+# Postal code -> coordinates from past results; addresses with a known code skip the Places API
+POSTAL_INDEX_PATH = Path(os.getenv("POSTAL_INDEX_PATH", str(PROJECT_ROOT/".cache"/"postal_index.npy")))
+POSTAL_SEEDS = (PROJECT_ROOT/"loc_data", PROJECT_ROOT/"valid_data")
+# Past coordinates that can seed the geocode cache (--import-coordinates); exports go elsewhere, this file is tracked
+COORDINATES_JSON = PROJECT_ROOT/"loc_data"/"coordinates.json"
+COORDINATES_EXPORT = PROJECT_ROOT/".cache"/"coordinates.json"
+
+# Places requests in flight at once, and per second, when geocoding a batch
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "8"))
+GEOCODE_QPS = float(os.getenv("GEOCODE_QPS", "10"))
+
+# One pooled session, so concurrent requests reuse their connections to the Places API
+PLACES_SESSION = requests.Session()
+PLACES_SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=GEOCODE_WORKERS))
+
+
+class RateLimiter:
+    def __init__(self, qps):
+        """
+        Spaces calls evenly so that at most `qps` start per second, across threads.
+
+        Args:
+            qps: Calls per second (0 = unlimited)
+        """
+        self.interval = 1 / qps if qps > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
 
 def googlePlace_searchText(query: str):
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable not found")
     headers = {
-        "X-Goog-Api-Key": GOOGLE_API_KEY,
+        "X-Goog-Api-Key": api_key,
         "Content-Type": "application/json",
         "X-Goog-FieldMask": "places.formattedAddress,places.location"
     }
@@ -25,7 +71,7 @@ def googlePlace_searchText(query: str):
         "regionCode": "SG",
         "languageCode": "en"
     }
-    response = requests.post(
+    response = PLACES_SESSION.post(
         url=GOOGLE_PLACES_SEARCH_URL, headers=headers, json=body, timeout=10
     )
     response.raise_for_status()
@@ -34,6 +80,83 @@ def googlePlace_searchText(query: str):
         return None
     return result["places"][0]
 
+def geocode_many(queries, workers=GEOCODE_WORKERS, qps=GEOCODE_QPS):
+    """
+    googlePlace_searchText() for a batch of queries, through the geocode cache (failed requests are not cached).
+
+    Queries that differ only in case, punctuation or spacing are looked up once.
+    Cached ones are answered straight away; the rest go to Places concurrently
+    (`workers` at a time, at most `qps` per second), so a batch takes about as
+    long as its slowest few requests.
+
+    Returns:
+        {query: place or None} for every query that did not fail
+    """
+    groups = {}
+    for query in queries:
+        if query:
+            groups.setdefault(normalize_query(query), []).append(query)
+
+    cache = get_geocode_cache()
+    resolved = {}
+    pending = []
+    for same in groups.values():
+        place = cache.get(same[0])
+        if place is MISS:
+            pending.append(same)
+        else:
+            resolved.update(dict.fromkeys(same, place))
+
+    limiter = RateLimiter(qps)
+
+    def fetch(query):
+        limiter.wait()
+        place = googlePlace_searchText(query)
+        cache.put(query, place)
+        return place
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="geocode") as executor:
+            futures = {executor.submit(fetch, same[0]): same for same in pending}
+            for future in as_completed(futures):
+                same = futures[future]
+                try:
+                    resolved.update(dict.fromkeys(same, future.result()))
+                except Exception as e:
+                    print(f"Error for {same[0]}: {e}")
+    return resolved
+
+def build_postal_index(paths=POSTAL_SEEDS, dest=POSTAL_INDEX_PATH):
+    """Index every postal code with coordinates in past results (loc_data and enrichment outputs)."""
+    index = PostalIndex.from_records(seed_records(paths))
+    index.save(dest)
+    return index
+
+_postal_index = None
+_postal_lock = threading.Lock()
+
+def get_postal_index():
+    """The postal index, memory-mapped from POSTAL_INDEX_PATH (built from POSTAL_SEEDS the first time)."""
+    global _postal_index
+    if _postal_index is None:
+        with _postal_lock:
+            if _postal_index is None:
+                try:
+                    _postal_index = PostalIndex.load(POSTAL_INDEX_PATH)
+                except (OSError, ValueError):
+                    _postal_index = build_postal_index()
+    return _postal_index
+
+def update_postal_index(paths):
+    """Add the postal codes resolved in `paths` (e.g. this run's outputs) to the saved index."""
+    global _postal_index
+    index = PostalIndex.from_records(seed_records(paths), base=get_postal_index())
+    with _postal_lock:
+        # Drop the memory-mapped copy before the file is replaced
+        _postal_index = index
+    index.save(POSTAL_INDEX_PATH)
+    return index
+
 def cleaning(desc):
     if not isinstance(desc,str):
         return 
@@ -43,102 +166,205 @@ def cleaning(desc):
     region  = region_match.group(1) if region_match else None
     return district,region
 
-#getting district 
-districts = gpd.read_file(PROJECT_ROOT/"config"/"districts.geojson")
-districts[['PLN_AREA_N','REGION_N']] =  districts["Description"].apply(
-    lambda d: pd.Series(cleaning(d))
-)
+def parse_districts(geojson_path=DISTRICTS_GEOJSON):
+    """Districts GeoJSON -> GeoDataFrame of geometry, PLN_AREA_N and REGION_N."""
+    districts = gpd.read_file(geojson_path)
+    parsed = [cleaning(d) or (None, None) for d in districts["Description"]]
+    districts["PLN_AREA_N"] = [district for district, _ in parsed]
+    districts["REGION_N"] = [region for _, region in parsed]
+    return districts[["PLN_AREA_N", "REGION_N", "geometry"]]
+
+def build_districts(dest=DISTRICTS_ARTIFACT, geojson_path=DISTRICTS_GEOJSON):
+    """Parse the districts GeoJSON once and save it as GeoParquet, which loads without re-parsing."""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    parse_districts(geojson_path).to_parquet(tmp)
+    os.replace(tmp, dest)
+    return dest
+
+def load_districts():
+    """
+    Districts from DISTRICTS_ARTIFACT, (re)building it from the GeoJSON when it
+    is missing or stale. Falls back to parsing the GeoJSON if the artifact cannot
+    be written or read (e.g. pyarrow not installed).
+    """
+    try:
+        if not DISTRICTS_ARTIFACT.exists() or DISTRICTS_ARTIFACT.stat().st_mtime < DISTRICTS_GEOJSON.stat().st_mtime:
+            build_districts()
+        return gpd.read_parquet(DISTRICTS_ARTIFACT)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"[debug] Districts artifact unavailable ({e}); parsing {DISTRICTS_GEOJSON.name}", file=sys.stderr)
+        return parse_districts()
+
+_districts = None
+_districts_lock = threading.Lock()
+
+def get_districts():
+    """The districts GeoDataFrame, loaded (and its spatial index built) on first use."""
+    global _districts
+    if _districts is None:
+        with _districts_lock:
+            if _districts is None:
+                districts = load_districts()
+                districts.sindex
+                _districts = districts
+    return _districts
+
+def __getattr__(name):
+    # `location.districts` still works, but only loads the districts when asked for
+    if name == "districts":
+        return get_districts()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def which_district(lo,la):
-    point = Point(lo,la)
-    match = districts[districts.contains(point)]
-    if not match.empty:
-        return match.iloc[0]["PLN_AREA_N"], match.iloc[0]["REGION_N"]
+    districts = get_districts()
+    # The spatial index only tests the polygons whose bounding box holds the point
+    hits = districts.sindex.query(Point(lo,la), predicate="within")
+    if len(hits):
+        match = districts.iloc[hits.min()]  # first matching row, as a scan would find
+        return match["PLN_AREA_N"], match["REGION_N"]
     return None,None
 
+def assign_districts(df, lon_col="longitude", lat_col="latitude"):
+    """
+    Planning area and region for every row of `df` in one spatial join.
 
-def enrich_with_coordinates(json_input_path, json_output_path):
-    #input path for json file
-    with open(json_input_path, "r", encoding="utf-8") as f:
-        events = json.load(f)
+    Returns a DataFrame with the same index and `planning_area` / `region`
+    columns, title-cased like enrich_with_coordinates; None where a row has no
+    coordinates or falls outside every district.
+    """
+    result = pd.DataFrame({"planning_area": None, "region": None}, index=df.index, dtype=object)
+    has_coords = df[lon_col].notna() & df[lat_col].notna()
+    if not has_coords.any():
+        return result
+
+    districts = get_districts()
+    points = gpd.GeoDataFrame(
+        geometry=gpd.points_from_xy(df.loc[has_coords, lon_col], df.loc[has_coords, lat_col]),
+        index=df.index[has_coords], crs=districts.crs,
+    )
+    joined = gpd.sjoin(points, districts[["PLN_AREA_N", "REGION_N", "geometry"]], how="inner", predicate="within")
+    # A point on a shared border can match twice: keep the first district, like which_district
+    joined = joined.sort_values("index_right", kind="stable")
+    joined = joined[~joined.index.duplicated(keep="first")]
+    result.loc[joined.index, "planning_area"] = joined["PLN_AREA_N"].str.title()
+    result.loc[joined.index, "region"] = joined["REGION_N"].str.title()
+    return result
 
-    #input path for excel
-    #df = pd.read_csv(json_input_path)
-    #events = df.to_dict(orient="records")
 
-    enriched = []
-    for ev in events:
+def apply_locations(events, offline, places):
+    """
+    Set address_display, coordinates, planning_area and region on each event.
+
+    Args:
+        events: Events to update in place
+        offline: Per event, the (longitude, latitude) from the postal index, or None
+        places: geocode_many() results, by venue_name
+    """
+    for ev, known in zip(events, offline):
         query = ev.get("venue_name")
-        # venue_name = ev.get("venue_name")
-        # title = ev.get("title")
-        # category = ev.get("categories")
         coords = {"longitude": None, "latitude": None}
         formatted_address = query
-        if query:
-            try:
-                place = googlePlace_searchText(query)
-                if place:
-                    formatted_address = place.get("formattedAddress", query)
-                    loc = place.get("location", {})
-                    coords["longitude"] = loc.get("longitude")
-                    coords["latitude"] = loc.get("latitude")
-            except Exception as e:
-                print(f"Error for {query}: {e}")
-    
-
-        district,area = (None,None)
-        if coords["latitude"] and coords["longitude"]:
-            res =  which_district(coords["longitude"],coords["latitude"])
-            if res: 
-                district, area = res
+        if known:
+            formatted_address = ev["address_display"]
+            coords["longitude"], coords["latitude"] = known
+        elif query and places.get(query):
+            place = places[query]
+            formatted_address = place.get("formattedAddress", query)
+            loc = place.get("location", {})
+            coords["longitude"] = loc.get("longitude")
+            coords["latitude"] = loc.get("latitude")
 
         ev["address_display"] = formatted_address
+        ev.pop("address_source", None)
         ev["longitude"] = coords["longitude"]
         ev["latitude"] = coords["latitude"]
-        ev["planning_area"] = district.title() if district else None
-        ev["region"] = area.title() if area else None
-
-        enriched.append(ev)
-
-        # enriched.append({
-        #     "category":category,
-        #     "title":title,
-        #     "venue name":venue_name,
-        #     "resolved address":formatted_address,
-        #     "area":area.title() if area else None,
-        #     "district": district.title() if district else None,
-        #     "longitude": coords["longitude"] if coords["longitude"] else "",
-        #     "latitude": coords["latitude"] if coords["latitude"] else ""
-        # })'
-        
-    #output path for json
-    with open(json_output_path, "w", encoding="utf-8") as f:
-        json.dump(enriched,f, indent=2, ensure_ascii=False)
-
-    #output path for excel
-   #pd.DataFrame(enriched).to_csv(json_output_path, index=False)
-    
-    #df_new = pd.DataFrame(enriched,columns = ["category","title","venue name","resolved address","area","district","longitude","latitude"])
 
-    #if os.path.exists(output_file):
-    #    old_df = pd.read_excel(output_file)
-     #   combined_df = pd.concat([old_df,df_new],ignore_index = True)
-    #else: 
-     #   combined_df = df_new
+    # Districts for all events in one spatial join
+    if events:
+        coords_df = pd.DataFrame(
+            [{"longitude": ev["longitude"] or None, "latitude": ev["latitude"] or None} for ev in events],
+            dtype=float,
+        )
+        districts_df = assign_districts(coords_df)
+        for ev, (district, area) in zip(events, districts_df.itertuples(index=False)):
+            ev["planning_area"] = district
+            ev["region"] = area
 
-    #combined_df.to_excel(output_file, index = False)
+def enrich_files(paths):
+    """
+    Enrich several event files at once: [(json_input_path, json_output_path), ...].
 
-    print(f"Saved {len(enriched)} events with coordinates → {json_output_path}")
+    Every file is read first, so a venue that appears in many files is geocoded
+    once and all Places requests for the batch run together.
+    """
+    postal = get_postal_index()
+    batches = []
+    for json_input_path, json_output_path in paths:
+        with open(json_input_path, "r", encoding="utf-8") as f:
+            events = json.load(f)
+        # Only an address from the item's own text identifies its venue; a page-level fallback is the organiser's
+        offline = [None if ev.get("address_source") == "page" else postal.lookup_address(ev.get("address_display"))
+                   for ev in events]
+        batches.append((events, offline, json_output_path))
+
+    queries = {
+        ev.get("venue_name")
+        for events, offline, _ in batches
+        for ev, known in zip(events, offline)
+        if not known and ev.get("venue_name")
+    }
+    places = geocode_many(queries)
+
+    for events, offline, json_output_path in batches:
+        apply_locations(events, offline, places)
+        with open(json_output_path, "w", encoding="utf-8") as f:
+            json.dump(events, f, indent=2, ensure_ascii=False)
+        print(f"Saved {len(events)} events with coordinates → {json_output_path}")
+
+def enrich_with_coordinates(json_input_path, json_output_path):
+    enrich_files([(json_input_path, json_output_path)])
+
+def enrich_folder(inp_path, out_path):
+    """Enrich every JSON file in `inp_path` into `out_path` as one batch, then index the new postal codes."""
+    inp_path, out_path = Path(inp_path), Path(out_path)
+    out_path.mkdir(parents=True, exist_ok=True)
+    files = sorted(inp_path.glob("*.json"))
+    print(f"Processing {len(files)} files from {inp_path}...")
+    enrich_files([(file, out_path/f"{file.stem}.json") for file in files])
+    get_postal_index().report()
+    update_postal_index([out_path])
 
 if __name__ == "__main__":
+    if "--build-districts" in sys.argv[1:]:
+        print(f"Wrote {build_districts()}")
+        sys.exit(0)
+    if "--build-postal-index" in sys.argv[1:]:
+        print(f"Indexed {len(build_postal_index())} postal codes → {POSTAL_INDEX_PATH}")
+        sys.exit(0)
+    if "--import-coordinates" in sys.argv[1:] or "--export-coordinates" in sys.argv[1:]:
+        # One-off: `--import-coordinates [file]` seeds the cache, `--export-coordinates [file]` dumps it
+        args = sys.argv[1:]
+        for flag, default in (("--import-coordinates", COORDINATES_JSON), ("--export-coordinates", COORDINATES_EXPORT)):
+            if flag not in args:
+                continue
+            i = args.index(flag) + 1
+            path = Path(args[i]) if i < len(args) and not args[i].startswith("--") else default
+            if flag == "--import-coordinates":
+                print(f"Imported {get_geocode_cache().import_json(path)} cache entries from {path}")
+            else:
+                print(f"Exported {get_geocode_cache().export_json(path)} places → {path}")
+        close_geocode_cache()
+        sys.exit(0)
+
     # # # loading all jsons
     inp_path = PROJECT_ROOT/"valid_data"/"November"/"19Nov"
     out_path = PROJECT_ROOT/"valid_data"/"November"/"19Nov"
-    out_path.mkdir(parents=True, exist_ok=True)
 
-    for file in inp_path.glob("*.json"):
-        print(f"Processing {file.name}...")
-        enrich_with_coordinates(file, out_path/f"{file.stem}.json")
+    enrich_folder(inp_path, out_path)
+
+    close_geocode_cache()
     # df = pd.read_csv(inp_path)
     # events = df.to_dict(orient="records")
     
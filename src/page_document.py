@@ -0,0 +1,66 @@
+import json
+from functools import cached_property
+from bs4 import BeautifulSoup
+from address_index import AddressIndex
+
+try:
+    import lxml  # noqa: F401  (only checking it is installed)
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+
+class PageDocument:
+    def __init__(self, html: str, base_url: str = ""):
+        """
+        A fetched page, parsed once and shared by every extractor.
+
+        The tree, its text and its JSON-LD are computed on first use and cached,
+        so extractors must treat `soup` as read-only. Uses lxml when it is
+        installed (several times faster on large pages), html.parser otherwise.
+
+        Args:
+            html: Full page HTML
+            base_url: URL the page was loaded from, for resolving relative links
+        """
+        self.html = html or ""
+        self.base_url = base_url
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        return BeautifulSoup(self.html, HTML_PARSER)
+
+    @cached_property
+    def title(self) -> str:
+        t = self.soup.title
+        return t.string.strip() if t and t.string else ""
+
+    @cached_property
+    def text(self) -> str:
+        """Page text, one text node per line (same as soup.get_text("\\n", strip=True))."""
+        return self.soup.get_text("\n", strip=True)
+
+    @cached_property
+    def jsonld_raw(self) -> list[str]:
+        raws = []
+        for tag in self.soup.find_all("script", {"type": "application/ld+json"}):
+            raw = tag.get_text(strip=True) or ""
+            if raw:
+                raws.append(raw)
+        return raws
+
+    @cached_property
+    def jsonld(self) -> list:
+        """Parsed JSON-LD objects; scripts that are not valid JSON are skipped."""
+        objs = []
+        for raw in self.jsonld_raw:
+            try:
+                objs.append(json.loads(raw))
+            except ValueError:
+                continue
+        return objs
+
+    @cached_property
+    def addresses(self) -> AddressIndex:
+        """Postal-code and JSON-LD addresses on the page, indexed once."""
+        return AddressIndex(self.text, self.jsonld)
@@ -0,0 +1,275 @@
+import sys
+import time
+
+# Records the time of the last DOM mutation so Python can ask "how long has it been quiet?"
+MUTATION_PROBE_JS = """
+() => {
+    if (window.__readiness) return;
+    window.__readiness = {lastMutation: performance.now(), mutations: 0};
+    const start = () => {
+        const target = document.documentElement || document;
+        new MutationObserver((records) => {
+            window.__readiness.lastMutation = performance.now();
+            window.__readiness.mutations += records.length;
+        }).observe(target, {childList: true, subtree: true, attributes: true, characterData: true});
+    };
+    if (document.documentElement) start();
+    else document.addEventListener('DOMContentLoaded', start, {once: true});
+}
+"""
+
+SAMPLE_JS = """
+() => {
+    const r = window.__readiness;
+    const body = document.body;
+    return {
+        probe: !!r,
+        quietMs: r ? performance.now() - r.lastMutation : 0,
+        elements: document.getElementsByTagName('*').length,
+        height: body ? body.scrollHeight : 0,
+        atBottom: body ? (window.scrollY + window.innerHeight >= body.scrollHeight - 2) : true,
+        readyState: document.readyState,
+    };
+}
+"""
+
+# Serializes only the data-index blocks we have not collected yet, in one round-trip
+COLLECT_BLOCKS_JS = """
+(seen) => {
+    const known = new Set(seen);
+    const out = [];
+    for (const el of document.querySelectorAll('div[data-index]')) {
+        const index = el.getAttribute('data-index');
+        if (known.has(index)) continue;
+        known.add(index);
+        out.push({index: index, html: el.innerHTML, text: (el.innerText || '').trim()});
+    }
+    return out;
+}
+"""
+
+# Scrolling: small steps once a virtualized list has been seen, big ones for ordinary pages
+SCROLL_STEP_PX = 300
+SCROLL_JUMP_PX = 5000
+SCROLL_QUIET_MS = 400
+# Settled scrolls at the bottom that changed nothing before the page counts as fully loaded
+STABLE_ROUNDS = 2
+
+# sample() result while a navigation has destroyed the execution context
+_NOT_LOADED = {"probe": False, "quietMs": 0, "elements": -1, "height": 0,
+               "atBottom": False, "readyState": "loading"}
+
+# Long-lived requests that never "finish" and would keep the page busy forever
+_IGNORED_RESOURCE_TYPES = {"websocket", "eventsource"}
+
+
+class PageReadiness:
+    def __init__(self, page, max_inflight=2):
+        """
+        Decide when a page has settled instead of sleeping for a fixed time.
+
+        A page counts as ready once the DOM has had no mutations for `quiet_ms`,
+        no more than `max_inflight` requests have been open for `quiet_ms`, and
+        the element count is unchanged between two samples. Attach before
+        page.goto() so the network tracker sees every request.
+
+        The waiting and scrolling logic is written once, as generators that yield
+        page operations ("evaluate", "sleep", "wheel", "content"); _drive() runs
+        them against a sync Page here and against an async Page in
+        AsyncPageReadiness, so the two cannot drift apart.
+
+        Args:
+            page: Playwright sync Page
+            max_inflight: Requests allowed to stay open (analytics, long polls)
+        """
+        self._track(page, max_inflight)
+        page.add_init_script(f"({MUTATION_PROBE_JS})()")
+
+    def _track(self, page, max_inflight):
+        self.page = page
+        self.max_inflight = max_inflight
+        self._inflight = set()
+        self._last_network = time.monotonic()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request):
+        if request.resource_type in _IGNORED_RESOURCE_TYPES:
+            return
+        self._inflight.add(request)
+        self._last_network = time.monotonic()
+
+    def _on_request_done(self, request):
+        self._inflight.discard(request)
+        self._last_network = time.monotonic()
+
+    def network_quiet_ms(self) -> float:
+        if len(self._inflight) > self.max_inflight:
+            return 0.0
+        return (time.monotonic() - self._last_network) * 1000
+
+    def _run(self, op):
+        kind, *args = op
+        if kind == "evaluate":
+            return self.page.evaluate(*args)
+        if kind == "sleep":
+            return self.page.wait_for_timeout(*args)
+        if kind == "wheel":
+            return self.page.mouse.wheel(0, *args)
+        return self.page.content()
+
+    def _drive(self, steps):
+        """Run a step generator to completion; errors from the page are raised inside it."""
+        result, error = None, None
+        while True:
+            try:
+                op = steps.throw(error) if error else steps.send(result)
+            except StopIteration as done:
+                return done.value
+            result, error = None, None
+            try:
+                result = self._run(op)
+            except Exception as e:
+                error = e
+
+    def _sample_steps(self):
+        try:
+            state = yield ("evaluate", SAMPLE_JS)
+        except Exception:
+            # Navigation in progress: the execution context was destroyed
+            return dict(_NOT_LOADED)
+        if not state["probe"] and state["readyState"] != "loading":
+            # Document was created before the init script was registered
+            yield ("evaluate", MUTATION_PROBE_JS)
+        return state
+
+    def _wait_steps(self, timeout, quiet_ms, poll_ms):
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+        prev_elements = None
+        state = yield from self._sample_steps()
+        while True:
+            settled = (
+                state["readyState"] != "loading"
+                and state["quietMs"] >= quiet_ms
+                and self.network_quiet_ms() >= quiet_ms
+                and state["elements"] == prev_elements
+            )
+            if settled or time.monotonic() >= deadline:
+                break
+            prev_elements = state["elements"]
+            yield ("sleep", poll_ms)
+            state = yield from self._sample_steps()
+
+        state["elapsed"] = time.monotonic() - start
+        state["settled"] = settled
+        if not settled:
+            print(f"[debug] Page not settled after {timeout:.1f}s "
+                  f"(dom quiet {state['quietMs']:.0f}ms, {len(self._inflight)} requests open)", file=sys.stderr)
+        return state
+
+    def _scroll_steps(self, deadline, ready_timeout, scroll_timeout):
+        state = yield from self._wait_steps(ready_timeout, 500, 150)
+        print(f"[debug] Initial content settled in {state['elapsed']:.1f}s", file=sys.stderr)
+
+        all_blocks = {}
+
+        def collect(blocks):
+            for block in blocks:
+                all_blocks[block["index"]] = {"html": block["html"], "text": block["text"]}
+
+        # Rows at the top of a virtualized list unmount once scrolled past: collect them before any scrolling
+        collect((yield ("evaluate", COLLECT_BLOCKS_JS, [])))
+        prev_height = state["height"]
+        stable_rounds = 0
+
+        # Stop once we are at the bottom and two settled scrolls changed nothing
+        while stable_rounds < STABLE_ROUNDS and time.monotonic() < deadline:
+            yield ("wheel", SCROLL_STEP_PX if all_blocks else SCROLL_JUMP_PX)
+            state = yield from self._wait_steps(scroll_timeout, SCROLL_QUIET_MS, 150)
+            height = state["height"]
+
+            new_blocks = yield ("evaluate", COLLECT_BLOCKS_JS, list(all_blocks))
+            collect(new_blocks)
+
+            print(f"[debug] Height={height} | Total blocks={len(all_blocks)} | "
+                  f"settled in {state['elapsed']:.1f}s", file=sys.stderr)
+
+            if height == prev_height and state["atBottom"] and not new_blocks:
+                stable_rounds += 1
+            else:
+                stable_rounds = 0
+            prev_height = height
+
+        html = yield ("content",)
+        return html, list(all_blocks.values())
+
+    def sample(self) -> dict:
+        """Current page state: DOM quiet time, element count, scroll height, bottom reached."""
+        return self._drive(self._sample_steps())
+
+    def wait(self, timeout: float = 15.0, quiet_ms: int = 500, poll_ms: int = 150) -> dict:
+        """
+        Block until the page settles or `timeout` seconds pass, whichever comes first.
+
+        Uses page.wait_for_timeout() between samples so Playwright keeps dispatching
+        the request events the network tracker relies on.
+
+        Returns:
+            The last sample plus `elapsed` seconds and `settled` (False on timeout)
+        """
+        return self._drive(self._wait_steps(timeout, quiet_ms, poll_ms))
+
+    def scroll_and_collect(self, deadline: float, ready_timeout: float = 15.0,
+                           scroll_timeout: float = 4.0) -> tuple[str, list[dict]]:
+        """
+        Wait for the loaded page, scroll it to the bottom and return (full html, data-index blocks).
+
+        Virtualized lists only keep the visible `div[data-index]` rows in the DOM, so
+        blocks are collected before scrolling and after every scroll step. Each
+        step waits only until the page has settled; scrolling stops at `deadline`
+        (time.monotonic()) at the latest.
+        """
+        return self._drive(self._scroll_steps(deadline, ready_timeout, scroll_timeout))
+
+
+class AsyncPageReadiness(PageReadiness):
+    """
+    PageReadiness for a playwright.async_api Page; create with `await AsyncPageReadiness.attach(page)`.
+
+    sample(), wait() and scroll_and_collect() return coroutines here.
+    """
+
+    def __init__(self, page, max_inflight=2):
+        # page.on() is synchronous in both APIs; add_init_script is awaited in attach()
+        self._track(page, max_inflight)
+
+    @classmethod
+    async def attach(cls, page, max_inflight=2):
+        self = cls(page, max_inflight)
+        await page.add_init_script(f"({MUTATION_PROBE_JS})()")
+        return self
+
+    async def _run(self, op):
+        kind, *args = op
+        if kind == "evaluate":
+            return await self.page.evaluate(*args)
+        if kind == "sleep":
+            return await self.page.wait_for_timeout(*args)
+        if kind == "wheel":
+            return await self.page.mouse.wheel(0, *args)
+        return await self.page.content()
+
+    async def _drive(self, steps):
+        result, error = None, None
+        while True:
+            try:
+                op = steps.throw(error) if error else steps.send(result)
+            except StopIteration as done:
+                return done.value
+            result, error = None, None
+            try:
+                result = await self._run(op)
+            except Exception as e:
+                error = e
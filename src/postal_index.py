@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Only "Singapore 123456" is trusted: a bare 6-digit number may be a phone or unit number,
+# or the organiser's footer address rather than the venue
+_SG_POSTAL_RE = re.compile(r"Singapore\s*(\d{6})(?!\d)", re.I)
+# Coordinates outside this box are not a Singapore location
+SG_BOUNDS = (103.55, 1.13, 104.15, 1.48)  # min lon, min lat, max lon, max lat
+
+ENTRY_DTYPE = np.dtype([("code", "<u4"), ("longitude", "<f8"), ("latitude", "<f8")])
+
+
+def postal_code(address) -> int | None:
+    """Singapore postal code in an address ('..., Singapore 039594' -> 39594), or None."""
+    if not isinstance(address, str):
+        return None
+    match = _SG_POSTAL_RE.search(address)
+    return int(match.group(1)) if match else None
+
+
+def _in_singapore(lon, lat) -> bool:
+    return SG_BOUNDS[0] <= lon <= SG_BOUNDS[2] and SG_BOUNDS[1] <= lat <= SG_BOUNDS[3]
+
+
+def _coordinate(value) -> float | None:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+
+def seed_records(paths):
+    """
+    Yield (address, longitude, latitude) from past results: JSON lists of events
+    (address_display) or coordinates (address), and CSVs with address_display,
+    longitude and latitude columns. Folders are searched recursively.
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in (".json", ".csv")))
+        elif path.exists():
+            files.append(path)
+
+    for file in files:
+        try:
+            if file.suffix.lower() == ".csv":
+                with open(file, newline="", encoding="utf-8") as f:
+                    rows = list(csv.DictReader(f))
+            else:
+                with open(file, encoding="utf-8") as f:
+                    rows = json.load(f)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            print(f"[debug] Skipping {file}: {e}", file=sys.stderr)
+            continue
+        if not isinstance(rows, list):
+            continue
+        for row in rows:
+            if isinstance(row, dict):
+                yield row.get("address_display") or row.get("address"), row.get("longitude"), row.get("latitude")
+
+
+class PostalIndex:
+    def __init__(self, entries: np.ndarray | None = None):
+        """
+        Postal code -> coordinates, for resolving Singapore addresses without the Places API.
+
+        Entries are kept in one array sorted by code, so a lookup is a binary
+        search and the saved .npy file can be memory-mapped instead of read.
+
+        Args:
+            entries: ENTRY_DTYPE array sorted by code (empty if None)
+        """
+        self.entries = entries if entries is not None else np.empty(0, dtype=ENTRY_DTYPE)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def from_records(cls, records, base: "PostalIndex | None" = None) -> "PostalIndex":
+        """
+        Build an index from (address, longitude, latitude) records, on top of `base`.
+
+        Where a code has several coordinates the median is kept, so one bad
+        geocode does not move a building. Codes already in `base` keep their
+        coordinates unless the records have the code too.
+        """
+        points = {}
+        for address, lon, lat in records:
+            code = postal_code(address)
+            lon, lat = _coordinate(lon), _coordinate(lat)
+            if code is None or lon is None or lat is None or not _in_singapore(lon, lat):
+                continue
+            points.setdefault(code, []).append((lon, lat))
+
+        new = np.empty(len(points), dtype=ENTRY_DTYPE)
+        for i, (code, coords) in enumerate(points.items()):
+            lon, lat = np.median(np.array(coords), axis=0)
+            new[i] = (code, lon, lat)
+
+        if base is not None and len(base):
+            old = np.asarray(base.entries)
+            new = np.concatenate([old[~np.isin(old["code"], new["code"])], new])
+        return cls(np.sort(new, order="code"))
+
+    def lookup(self, code: int | None) -> tuple[float, float] | None:
+        """(longitude, latitude) for a postal code, or None if it is not indexed."""
+        if code is not None and len(self.entries):
+            codes = self.entries["code"]
+            i = int(np.searchsorted(codes, code))
+            if i < len(codes) and codes[i] == code:
+                self.hits += 1
+                entry = self.entries[i]
+                return float(entry["longitude"]), float(entry["latitude"])
+        self.misses += 1
+        return None
+
+    def lookup_address(self, address) -> tuple[float, float] | None:
+        code = postal_code(address)
+        return self.lookup(code) if code is not None else None
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp, np.ascontiguousarray(self.entries))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path) -> "PostalIndex":
+        entries = np.load(path, mmap_mode="r")
+        if entries.dtype != ENTRY_DTYPE:
+            raise ValueError(f"{path} is not a postal index")
+        return cls(entries)
+
+    def stats(self) -> dict:
+        return {"codes": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def report(self):
+        print(f"[debug] Postal index: {len(self.entries)} codes, {self.hits} addresses resolved offline, "
+              f"{self.misses} not indexed", file=sys.stderr)
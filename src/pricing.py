@@ -0,0 +1,178 @@
+import re
+
+# Every token the price rules look at, found in one left-to-right scan. The leading
+# character class lets the regex engine skip ahead to possible token starts.
+# Numbers keep all their decimals so the rules can tell "$12.50" from "12.345".
+_PRICE_TOKEN_RE = re.compile(r"""
+    (?=[cfpds$\d])
+    (?:
+      (?P<free>complimentary|free)
+    | (?P<contact>contact|check\ website)
+    | (?P<per>per\s+(?:child|adult|entry))
+    | (?P<dollars>dollar(?:s(?!gd))?)
+    | (?P<sgd>sgd)
+    | (?P<usd>s?\$)
+    | (?P<num>\d+(?:\.\d+)?)
+    )
+""", re.I | re.X)
+
+# Suffix rules, re-run on the few characters around a match to read the number
+# exactly as they always have ("12.345 sgd" -> 345, "12.5 dollars" -> 5)
+_SGD_SUFFIX_RE = re.compile(r"(\d+(?:\.\d{1,2})?)\s*sgd", re.I)
+_DOLLARS_WORD_RE = re.compile(r"(\d+)\s*dollars?", re.I)
+
+# What may sit between the two ends of a range: "$10 - $20", "$10 to $20"
+_RANGE_GAP_RE = re.compile(r"\s*(?:-|to)\s*", re.I)
+
+# Rules in priority order; the first rule that matches anywhere decides the price
+RANGE, SGD_RANGE, DOLLAR, SGD, SGD_SUFFIX, PER_PERSON, DOLLARS_WORD = range(7)
+
+
+def _amount(num: str) -> float:
+    """Value of a number followed by nothing numeric: at most two decimals are read."""
+    whole, _, frac = num.partition(".")
+    return float(f"{whole}.{frac[:2]}") if frac else float(whole)
+
+
+def _amount_before(text: str, num, word, pattern) -> float:
+    """Value of a number directly followed by a word ("25 SGD", "25 dollars")."""
+    start = num[1]
+    while start and (text[start - 1].isdigit() or text[start - 1] == "."):
+        start -= 1
+    return float(pattern.search(text, start, word[2]).group(1))
+
+
+def _adjacent(text: str, a, b) -> bool:
+    """True if only whitespace separates token a from token b."""
+    return a[2] <= b[1] and not text[a[2]:b[1]].strip()
+
+
+def _closed(tok) -> bool:
+    # "$10.555-" never matched a range: a number can only be followed by more text if it has <= 2 decimals
+    return tok[0] != "num" or len(tok[3].partition(".")[2]) <= 2
+
+
+def scan_prices(text: str) -> dict:
+    """
+    Find every price mention in `text` with a single regex scan.
+
+    Returns:
+        {
+            "free": bool,        # "free" / "complimentary" appears
+            "contact": bool,     # "contact" / "check website" appears
+            "min": float|None,   # from the highest-priority price rule that matched
+            "max": float|None,
+            "rule": int|None,    # which rule (RANGE, DOLLAR, ...) produced min/max
+            "spans": [(start, end), ...],  # every free/contact/price token, in text order
+        }
+    """
+    result = {"free": False, "contact": False, "min": None, "max": None, "rule": None, "spans": []}
+    if not text:
+        return result
+
+    tokens = []
+    last_per = -1
+    for m in _PRICE_TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "free":
+            result["free"] = True
+        elif kind == "contact":
+            result["contact"] = True
+        elif kind == "per":
+            last_per = m.start()
+        result["spans"].append(m.span())
+        tokens.append((kind, m.start(), m.end(), m.group()))
+
+    best = None  # (rule, min, max)
+
+    def offer(rule, lo, hi):
+        nonlocal best
+        if best is None or rule < best[0]:
+            best = (rule, lo, hi)
+
+    n = len(tokens)
+    for i, tok in enumerate(tokens):
+        if best is not None and best[0] == RANGE:
+            break
+        kind = tok[0]
+        nxt = tokens[i + 1] if i + 1 < n else None
+        if kind in ("usd", "sgd") and nxt and nxt[0] == "num" and _adjacent(text, tok, nxt):
+            # <cur> <num> [-|to] <cur> <num>, with the same currency on both sides
+            rng = tokens[i + 2:i + 4]
+            if (len(rng) == 2 and _closed(nxt) and rng[0][0] == kind and rng[1][0] == "num"
+                    and _RANGE_GAP_RE.fullmatch(text, nxt[2], rng[0][1])
+                    and _adjacent(text, rng[0], rng[1])):
+                offer(RANGE if kind == "usd" else SGD_RANGE, _amount(nxt[3]), _amount(rng[1][3]))
+            else:
+                offer(DOLLAR if kind == "usd" else SGD, _amount(nxt[3]), _amount(nxt[3]))
+        elif kind == "num" and nxt:
+            if nxt[0] == "sgd" and _adjacent(text, tok, nxt):
+                value = _amount_before(text, tok, nxt, _SGD_SUFFIX_RE)
+                offer(SGD_SUFFIX, value, value)
+            elif nxt[0] == "dollars" and _adjacent(text, tok, nxt):
+                value = _amount_before(text, tok, nxt, _DOLLARS_WORD_RE)
+                offer(DOLLARS_WORD, value, value)
+        if kind == "num" and tok[1] < last_per:
+            # The first number anywhere before a "per child/adult/entry"
+            offer(PER_PERSON, _amount(tok[3]), _amount(tok[3]))
+
+    if best is not None:
+        result["rule"], result["min"], result["max"] = best
+    return result
+
+
+def teaser_from_prices(min_price, max_price, has_free=False):
+    if has_free and max_price > 0:
+        return "Free + Paid options"
+    if min_price == 0.0 and max_price == 0.0:
+        return "Free"
+    if min_price is not None and min_price > 0:
+        if min_price == max_price:
+            return f"From ${min_price:.0f}"
+    return "Check website for pricing"
+
+
+def extract_price(text):
+    if not text:
+        return {
+            "price": 0.0,
+            "price_display": "Please contact for pricing",
+            "price_display_teaser": "Contact for pricing"
+        }
+
+    scan = scan_prices(text)
+    if scan["free"]:
+        return {
+            "price": 0.0,
+            "price_display": "Free",
+            "price_display_teaser": "Free"
+        }
+
+    if scan["contact"]:
+        return {
+            "price": 0.0,
+            "price_display": "Please contact for pricing",
+            "price_display_teaser": "Contact for pricing"
+        }
+
+    if scan["rule"] in (RANGE, SGD_RANGE):
+        min_price, max_price = scan["min"], scan["max"]
+        return {
+            "price": min_price,
+            "price_display": f"S${min_price:.2f} - S${max_price:.2f}",
+            "price_display_teaser": teaser_from_prices(min_price, max_price)
+        }
+    if scan["rule"] is not None:
+        price = scan["min"]
+        return {
+            "price": price,
+            "price_display": f"S${price:.2f}",
+            "price_display_teaser": teaser_from_prices(price, price)
+        }
+
+    # Otherwise unknown
+    return {
+        "price": None,
+        "price_display": "Please contact for pricing",
+        "price_display_teaser": "From $"  # safe fallback
+    }
@@ -0,0 +1,66 @@
+import sys
+
+from gemini_executor import estimate_tokens
+
+
+def pack_by_tokens(texts: list[str], token_budget: int, max_items: int = 15) -> list[list[int]]:
+    """
+    Group source indices into batches whose estimated tokens stay under `token_budget`.
+
+    Batches keep source order. A single text larger than the budget gets a batch
+    of its own rather than being dropped.
+    """
+    batches = []
+    current = []
+    used = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def run_batches(batches: list[list[int]], call_batches) -> list[tuple[list[int], list]]:
+    """
+    Send every batch, then split only the ones that failed and send the halves again.
+
+    Args:
+        batches: Lists of source indices, e.g. from pack_by_tokens()
+        call_batches: fn(list of batches) -> one result per batch, None for a failure
+
+    Returns:
+        (batch, items) pairs for the batches that succeeded, in source order
+    """
+    done = []
+    pending = batches
+    while pending:
+        retry = []
+        for batch, items in zip(pending, call_batches(pending)):
+            if items is not None:
+                done.append((batch, items))
+            elif len(batch) > 1:
+                mid = len(batch) // 2
+                print(f"[debug] Batch of {len(batch)} cards failed, retrying as {mid} + {len(batch) - mid}",
+                      file=sys.stderr)
+                retry.extend([batch[:mid], batch[mid:]])
+            else:
+                print(f"[debug] Card {batch[0]} failed on its own, giving up", file=sys.stderr)
+        pending = retry
+    done.sort(key=lambda d: d[0][0])
+    return done
+
+
+def source_index_of(item: dict, batch: list[int], key: str = "_card") -> int | None:
+    """Source index the model reported for an item, if it is one of the batch's cards."""
+    if len(batch) == 1:
+        return batch[0]
+    try:
+        idx = int(item.get(key))
+    except (TypeError, ValueError):
+        return None
+    return idx if idx in batch else None
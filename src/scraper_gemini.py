@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
-import os, sys, json, re, requests
+import os, sys, json, re, requests, hashlib
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 from jsonschema import Draft7Validator  # kept in case you validate later
 from google import genai
 from pathlib import Path
 from google.genai import types as genai_types
-from playwright.sync_api import sync_playwright
+from google.genai import errors as genai_errors
+from browser_pool import BrowserPool
+from page_readiness import PageReadiness
+from gemini_executor import GeminiExecutor, estimate_tokens
+from gemini_governor import get_governor, is_unavailable
+from gemini_cache import get_gemini_cache
+from gemini_context import CachedPrefix
+from prompt_batching import pack_by_tokens, run_batches, source_index_of
+from page_document import PageDocument
+from pricing import extract_price
+from image_downloader import ImageDownloader
+from image_store import get_image_store, close_image_store
+from image_hash import near_duplicate_groups, near_matches
+from image_derivatives import parse_sizes, parse_formats
 import time
-from PIL import Image
-from io import BytesIO
+import threading
 
 
 
@@ -31,57 +43,132 @@ def load_venue():
     
 INSTRUCTIONS = load_instructions()
 
+# Shared head of every extraction prompt; built once and sent as the system instruction
+PROMPT_PREFIX = INSTRUCTIONS.replace("{SCHEMA}", json.dumps(SCHEMA, ensure_ascii=False)) + load_venue()
+
 #DOWNLOADING IMAGES
+# An image is flagged once near-duplicates of it appear under this many different venues
+IMAGE_REUSE_VENUES = int(os.getenv("IMAGE_REUSE_VENUES", "3"))
+
+IMAGE_DOWNLOADER = ImageDownloader(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "16")),
+    per_host=int(os.getenv("IMAGE_PER_HOST", "4")),
+    max_bytes=int(os.getenv("IMAGE_MAX_MB", "8")) * 1024 * 1024,
+    max_side=int(os.getenv("IMAGE_MAX_SIDE", "1600")),
+    derivative_sizes=parse_sizes(os.getenv("IMAGE_DERIVATIVE_SIZES", "320,800,1600")),
+    derivative_formats=parse_formats(os.getenv("IMAGE_DERIVATIVE_FORMATS", "webp,jpeg")),
+)
+
 def download_images(items,output_dir):
-    os.makedirs(output_dir,exist_ok = True)
-    downloaded =0
-    def slugify(text):
-        return re.sub(r'[^a-zA-Z0-9]+', '_', text.strip())[:50] if text else "unknown" 
+    """
+    Store every item image in the image store and link it into `output_dir` as <sha256>.jpg.
+
+    URLs already in the store are not downloaded again; images with identical
+    bytes share one file however many items or URLs use them.
+    """
+    entries = []
     for item in items:
         item_id = item.get("id") or "unknown"
-        title = item.get("title") or "unknown"
-        venue = item.get("venue_name") or "unknown"
         images = item.get("images") or []
 
         updated_images = []
-        for i, img_url in enumerate(images):
+        for img_url in images:
             url = img_url.get("url") if isinstance(img_url, dict) else img_url
             if not url:
                 continue
-            filename = f"{slugify(venue)}_{i+1}.jpg"
-            filepath = os.path.join(output_dir, filename)
-
-            # Create image_entry with filename
             image_entry = {
                 "url": url,
                 "source_credit": img_url.get("source_credit") if isinstance(img_url, dict) else item.get("organiser"),
-                "filename": filename
             }
-
-            if os.path.exists(filepath):
-                image_entry["local_path"] = str(filepath)
-            else:
-                try:
-                    response = requests.get(url, timeout=10)
-                    response.raise_for_status()
-                    img_data = response.content
-
-                    with Image.open(BytesIO(img_data)) as img:
-                        img.convert("RGB").save(filepath, format="JPEG", quality=85)
-                    image_entry["local_path"] = str(filepath)
-
-                    downloaded += 1
-                    print(f"Downloaded image for {item_id} from {url} → {filepath}")
-
-                except Exception as e:
-                    image_entry["local_path"] = None
-                    print(f"Failed to download image from {item_id}")
-
+            entries.append((item_id, image_entry))
             # Add the updated image entry to the list
             updated_images.append(image_entry)
 
         item["images"] = updated_images
-    print(f"Total images downloaded: {downloaded}")
+
+    urls = list(dict.fromkeys(entry["url"] for _, entry in entries))
+    store = get_image_store()
+    hashes = {url: store.lookup(url) for url in urls}
+    missing = [url for url in urls if not hashes[url]]
+    hashes.update(IMAGE_DOWNLOADER.download_all(missing, store))
+
+    for item_id, image_entry in entries:
+        sha256 = hashes.get(image_entry["url"])
+        if sha256:
+            path = store.link(sha256, output_dir)
+            image_entry["sha256"] = sha256
+            image_entry["filename"] = path.name
+            image_entry["local_path"] = str(path)
+        else:
+            image_entry["filename"] = None
+            image_entry["local_path"] = None
+            print(f"Failed to download image from {item_id}")
+    downloaded = sum(1 for url in missing if hashes.get(url))
+    print(f"Total images downloaded: {downloaded} ({len(urls) - len(missing)} already stored)")
+
+    dhashes = store.dhashes(entry["sha256"] for _, entry in entries if entry.get("sha256"))
+    collapse_near_duplicate_images(items, dhashes)
+    flag_reused_images(items, store, min_venues=IMAGE_REUSE_VENUES)
+
+    # Resized copies for thumbnails and cards, linked next to the full-size files
+    kept = [e for item in items for e in item.get("images") or [] if e.get("sha256")]
+    derivatives = IMAGE_DOWNLOADER.ensure_derivatives((e["sha256"] for e in kept), store)
+    for e in kept:
+        if derivatives.get(e["sha256"]):
+            e["derivatives"] = store.link_derivatives(e["sha256"], derivatives[e["sha256"]], output_dir)
+
+def collapse_near_duplicate_images(items, dhashes: dict[str, int]):
+    """Keep only the first of an item's images that look the same (e.g. one photo at two CDN sizes)."""
+    dropped = 0
+    for item in items:
+        images = item.get("images") or []
+        hashed = [i for i, e in enumerate(images) if e.get("sha256") in dhashes]
+        if len(hashed) < 2:
+            continue
+        labels = near_duplicate_groups([dhashes[images[i]["sha256"]] for i in hashed])
+        drop = {hashed[k] for k, label in enumerate(labels) if label != k}
+        if drop:
+            item["images"] = [e for i, e in enumerate(images) if i not in drop]
+            dropped += len(drop)
+    if dropped:
+        print(f"[debug] Dropped {dropped} near-duplicate images", file=sys.stderr)
+
+def flag_reused_images(items, store, min_venues: int = 3):
+    """
+    Mark images whose near-duplicates are used by `min_venues` or more venues.
+
+    Venues are counted across every page and run, from the store's record of
+    which venues each image was used for. Such images are usually site-wide
+    fallbacks (logos, banners) rather than photos of the venue; flagged entries
+    get "reused_by_venues": <count>.
+    """
+    entries = []
+    for item in items:
+        venue = (item.get("venue_name") or item.get("title") or "").strip().lower()
+        for e in item.get("images") or []:
+            if e.get("sha256"):
+                entries.append((venue, e))
+    if not entries:
+        return
+    store.record_venues({(e["sha256"], venue) for venue, e in entries if venue})
+
+    known, known_hashes = store.all_dhashes()
+    position = {sha: i for i, sha in enumerate(known)}
+    page = [sha for sha in dict.fromkeys(e["sha256"] for _, e in entries) if sha in position]
+    if not page:
+        return
+    matches = near_matches(known_hashes[[position[sha] for sha in page]], known_hashes)
+    similar = {sha: [known[j] for j in found] for sha, found in zip(page, matches)}
+    used_by = store.venues({s for found in similar.values() for s in found})
+    counts = {sha: len(set().union(*(used_by.get(s, set()) for s in found))) for sha, found in similar.items()}
+
+    flagged = 0
+    for _, e in entries:
+        if counts.get(e["sha256"], 0) >= min_venues:
+            e["reused_by_venues"] = counts[e["sha256"]]
+            flagged += 1
+    if flagged:
+        print(f"[debug] Flagged {flagged} images reused across {min_venues}+ venues", file=sys.stderr)
 
 import unicodedata
 
@@ -185,117 +272,89 @@ def enrich_free_price_fields(item):
 
     return item
 
-def fetch_html(url: str) -> str:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=False,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-gpu",
-                "--disable-dev-shm-usage"
-            ]
-        )
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                       "AppleWebKit/537.36 (KHTML, like Gecko) "
-                       "Chrome/115.0.0.0 Safari/537.36",
-            java_script_enabled=True
-        )
-        page = context.new_page()
-
-        try:
-            page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            
-            # Wait longer for initial content
-            time.sleep(10)  # Increased from 10
-            
-            # More aggressive scrolling to load all content
-            for i in range(2):  # Increased if the website takes time to load
-                page.mouse.wheel(0, 5000)  # Bigger scroll
-
-                time.sleep(3)  # Longer wait between scrolls
-                
-                # Check if we've loaded more content
-                project_count = len(page.query_selector_all('.project, [class*="project"]'))
-                print(f"[debug] Scroll {i+1}: Found {project_count} projects", file=sys.stderr)
-                
-                # If we found 22+ projects, we can stop
-                if project_count >= 15:
-                    print(f"[debug] Found all {project_count} projects!", file=sys.stderr)
-                    break
-
-            # Final wait
-            time.sleep(5)
-            
-            html = page.content()
-            return html
-        finally:
-            browser.close()
-
-def fetch_blocks(url: str):
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
-        page.goto(url, wait_until="domcontentloaded", timeout=60000)
-
-        all_blocks = {}
-        prev_height = 0
-        same_height_count = 0
-
-        while same_height_count < 7:  # allow more stability rounds
-            page.mouse.wheel(0, 300)
-            time.sleep(2)
-
-            # Get current scroll height
-            height = page.evaluate("document.body.scrollHeight")
-
-            # Grab new blocks
-            items = page.query_selector_all('div[data-index]')
-            for item in items:
-                index = item.get_attribute("data-index")
-                if index not in all_blocks:
-                    all_blocks[index] = {
-                        "html": item.inner_html(),
-                        "text": item.inner_text().strip()
-                    }
-
-            print(f"[debug] Height={height} | Total blocks={len(all_blocks)}", file=sys.stderr)
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-dev-shm-usage"
+]
+USER_AGENT = ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+              "AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/115.0.0.0 Safari/537.36")
+
+def make_browser_pool() -> BrowserPool:
+    """Browser pool shared by fetch_page for a whole run."""
+    return BrowserPool(
+        size=int(os.getenv("BROWSER_POOL_SIZE", "1")),
+        pages_per_context=int(os.getenv("BROWSER_PAGES_PER_CONTEXT", "20")),
+        headless=False,
+        launch_args=BROWSER_ARGS,
+        context_options={"user_agent": USER_AGENT, "java_script_enabled": True},
+    )
 
-            # Stop only when height stops growing
-            if height == prev_height:
-                same_height_count += 1
-            else:
-                same_height_count = 0
+# Wall-clock caps (seconds) for the readiness waits in fetch_page
+PAGE_READY_TIMEOUT = float(os.getenv("PAGE_READY_TIMEOUT", "15"))
+SCROLL_READY_TIMEOUT = float(os.getenv("SCROLL_READY_TIMEOUT", "4"))
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", "120"))
 
-            prev_height = height
+def fetch_page(url: str, pool: BrowserPool | None = None) -> tuple[str, list[dict]]:
+    """Load the page once, scroll it once and return (full html, data-index blocks).
 
-        browser.close()
-        return list(all_blocks.values())
+    See PageReadiness.scroll_and_collect; the final page.content() is taken in the same session.
+    """
+    if pool is None:
+        with make_browser_pool() as own_pool:
+            return fetch_page(url, own_pool)
 
+    with pool.page() as page:
+        readiness = PageReadiness(page)
+        deadline = time.monotonic() + PAGE_FETCH_TIMEOUT
+        page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        return readiness.scroll_and_collect(deadline, PAGE_READY_TIMEOUT, SCROLL_READY_TIMEOUT)
 
-def find_jsonld_events(soup: BeautifulSoup):
-    blocks = []
-    for tag in soup.find_all("script", {"type": "application/ld+json"}):
-        try:
-            raw = tag.get_text(strip=True) or ""
-            if "Event" in raw:
-                blocks.append(raw)
-        except Exception:
-            continue
-    return blocks
 
 #scoring the ranking
-def score_card_html(html: str) -> int:
-    """Higher = more likely to be a listing card."""
+_CARD_HEADINGS = {"h1", "h2", "h3", "h4"}
+
+def card_features(node) -> tuple[str, str, bool]:
+    """One walk over the node: (normalized text, lowercased text + tag names + attribute values, has h1-h4).
+
+    The haystack stands in for the serialized HTML the keyword checks used to search,
+    without serializing or re-parsing anything.
+    """
+    interesting = node.interesting_string_types
+    texts = []
+    markup = [node.name or ""]
+    has_heading = node.name in _CARD_HEADINGS
+    for attr_val in (node.attrs or {}).values():
+        markup.append(" ".join(attr_val) if isinstance(attr_val, list) else str(attr_val))
+
+    for d in node.descendants:
+        if isinstance(d, Tag):
+            markup.append(d.name)
+            if d.name in _CARD_HEADINGS:
+                has_heading = True
+            for attr_val in d.attrs.values():
+                markup.append(" ".join(attr_val) if isinstance(attr_val, list) else str(attr_val))
+        elif type(d) in interesting:
+            t = d.strip()
+            if t:
+                texts.append(t)
+
+    text = re.sub(r"\s+", " ", " ".join(texts))
+    haystack = (text + " " + " ".join(markup)).lower()
+    return text, haystack, has_heading
+
+def score_card_node(node, features=None) -> int:
+    """Higher = more likely to be a listing card. Works on the parsed node directly."""
+    text, h, has_heading = features or card_features(node)
     s = 0
-    h = html.lower()
 
     if any(word in h  for word in ['playground','facility','venue','location','attraction']):
         s+=5
     if any(word in h for word in ['about','overview','features','amenities']):
         s+=4
-    if "<h1" in h or "<h2" in h or "<h3" in h or "<h4" in h:
+    if has_heading:
         s += 4
     if "operating hours" in h or "contact" in h or "address" in h: 
         s+=3
@@ -304,96 +363,12 @@ def score_card_html(html: str) -> int:
         s+=2
     if "single admission" in h or "package" in h: 
         s+=2
-    
 
-    text_len = len(re.sub(r"\s+", " ", BeautifulSoup(html, "html.parser").get_text(" ", strip=True)))
-    if 200 <= text_len <= 2000:
+    if 200 <= len(text) <= 2000:
         s += 2
     return s
 
 #prices
-def extract_price(text):
-    if not text:
-        return {
-            "price": 0.0,
-            "price_display": "Please contact for pricing",
-            "price_display_teaser": "Contact for pricing"
-        }
-    if re.search(r"(complimentary|free)", text, re.I):
-        return {
-        "price": 0.0,
-        "price_display": "Free",
-        "price_display_teaser": "Free"
-    }
-
-    if re.search(r"(contact|check website)", text, re.I):
-        return {
-        "price": 0.0,
-        "price_display": "Please contact for pricing",
-        "price_display_teaser": "Contact for pricing"
-    }
-
-    
-    text_clean = re.sub(r'\s+', ' ', text.strip())
-    
-    price_patterns = [
-        # Range patterns -
-        r'(?:from\s*)?s?\$\s*(\d+(?:\.\d{1,2})?)\s*(?:-|to)\s*s?\$\s*(\d+(?:\.\d{1,2})?)',  
-        r'sgd\s*(\d+(?:\.\d{1,2})?)\s*(?:-|to)\s*sgd\s*(\d+(?:\.\d{1,2})?)',  
-        
-        # Single price patterns
-        r'(?:from\s*)?s?\$\s*(\d+(?:\.\d{1,2})?)',  # $25.00, S$25, $ 25, from $25
-        r'sgd\s*(\d+(?:\.\d{1,2})?)',   # SGD 25.00
-        r'(\d+(?:\.\d{1,2})?)\s*sgd',   # 25.00 SGD
-        r'price:\s*s?\$\s*(\d+(?:\.\d{1,2})?)',  # Price: $25
-        r'cost:\s*s?\$\s*(\d+(?:\.\d{1,2})?)',   # Cost: $25
-        
-        # Special patterns
-        r'complimentary.*(?:guests|members).*?(\d+(?:\.\d{1,2})?)',
-        r'(\d+(?:\.\d{1,2})?).*?(?:per child|per adult|per entry)',
-        r'(\d+)\s*dollars?',  # 25 dollars
-        r'complimentary|free(?: of charge| free admission)?' # Free, Free of charge, Free admission
-    ]
-    
-    has_free = bool(re.search(r"(complimentary|free)", text, re.I))
-    text = text_clean.lower()
-
-    for pattern in price_patterns: 
-        matches = re.findall(pattern,text,re.IGNORECASE)
-        if matches:
-            if isinstance(matches[0], tuple):  # Range pattern
-                min_price = float(matches[0][0])
-                max_price = float(matches[0][1]) if matches[0][1] else min_price
-                return {
-                    "price": min_price,
-                    "price_display": f"S${min_price:.2f} - S${max_price:.2f}",
-                    "price_display_teaser": teaser_from_prices(min_price, max_price, has_free)
-                }
-            else: 
-                price = float(matches[0])
-                return {
-                    "price": price,
-                    "price_display": f"S${price:.2f}",
-                    "price_display_teaser": teaser_from_prices(price, price, has_free)
-                }
-            
-
-    
-    # If we didn't match but saw "free"
-    if has_free:
-        return {
-            "price": 0.0,
-            "price_display": "Free",
-            "price_display_teaser": "Free"
-        }
-
-    # Otherwise unknown
-    return {
-        "price": None,
-        "price_display": "Please contact for pricing",
-        "price_display_teaser": "From $"  # safe fallback
-    }
-
 def merge_price_fields(item: dict, text: str):
     price_info = extract_price(text)
     for k in ["price", "price_display", "price_display_teaser"]:
@@ -423,17 +398,6 @@ def process_images(url):
 
     return url
 
-def teaser_from_prices(min_price, max_price, has_free=False):
-    if has_free and max_price > 0:
-        return "Free + Paid options"
-    if min_price == 0.0 and max_price == 0.0:
-        return "Free"
-    if min_price is not None and min_price > 0:
-        if min_price == max_price: 
-            return f"From ${min_price:.0f}"
-    return "Check website for pricing"
-
-
 def _extract_from_srcset(val: str):
     return [p.strip().split(" ")[0].strip() for p in (val or "").split(",") if p.strip()]
 
@@ -491,12 +455,14 @@ def images_from_node(node, base_url: str):
             dedup.append(u)
     return dedup[:5]
 
-def images_near_heading(node, base_url: str, max_siblings: int = 8):
+def images_near_heading(node, base_url: str, max_siblings: int = 8, images_of=None):
     if not node:
         return []
+    # images_of lets extract_heading_groups pass a memoized images_from_node
+    images_of = images_of or (lambda n: images_from_node(n, base_url))
 
     # First try the heading's parent
-    imgs = images_from_node(node.parent if node.parent else node, base_url)
+    imgs = images_of(node.parent if node.parent else node)
     if imgs:
         return imgs
 
@@ -506,7 +472,7 @@ def images_near_heading(node, base_url: str, max_siblings: int = 8):
         sib = sib.find_next_sibling()
         if not sib:
             break
-        imgs = images_from_node(sib, base_url)
+        imgs = images_of(sib)
         if imgs:
             return imgs
 
@@ -516,101 +482,178 @@ def images_near_heading(node, base_url: str, max_siblings: int = 8):
         sib = sib.find_previous_sibling()
         if not sib:
             break
-        imgs = images_from_node(sib, base_url)
+        imgs = images_of(sib)
         if imgs:
             return imgs
 
     # Try grandparent
     if node.parent and node.parent.parent:
-        imgs = images_from_node(node.parent.parent, base_url)
+        imgs = images_of(node.parent.parent)
         if imgs:
             return imgs
 
     return []
 
+class NodeImages:
+    def __init__(self, soup: BeautifulSoup, base_url: str):
+        """
+        Memoized images_from_node for one document.
+
+        One pass marks every node whose subtree can yield an image (an <img>, a
+        <picture><source srcset>, or a background-image style), so lookups on
+        image-free nodes return immediately and each node is scanned at most once,
+        however many headings look at it.
+        """
+        self.base_url = base_url
+        self._cache = {}
+        self._may_have = set()
+        bg = re.compile(r"background-image:\s*url\(", re.I)
+        for el in soup.find_all(["img", "source"]) + soup.find_all(style=bg):
+            if el.name == "img" or (el.name == "source" and el.has_attr("srcset")
+                                    and el.find_parent("picture") is not None):
+                self._mark_ancestors(el)
+            elif el.has_attr("style") and bg.search(el.get("style") or ""):
+                # A node's own background counts for itself; a div's also counts for its ancestors
+                self._may_have.add(id(el))
+                if el.name == "div":
+                    self._mark_ancestors(el)
+
+    def _mark_ancestors(self, el):
+        for parent in el.parents:
+            if id(parent) in self._may_have:
+                break
+            self._may_have.add(id(parent))
+
+    def __call__(self, node) -> list[str]:
+        key = id(node)
+        if key not in self._may_have:
+            return []
+        if key not in self._cache:
+            self._cache[key] = images_from_node(node, self.base_url)
+        return self._cache[key]
+
+
+CANDIDATE_SELECTORS = [
+    ".card", ".listing", "article", ".event", ".tile", ".result",
+    "ul li", "ol li", ".grid > div", ".row > .col",
+
+    # Venue focused selectors
+    ".venue", ".location", ".facility", ".center", ".club",
+    ".playground", ".attraction", "[class*=venue]", "[class*=location]",
+    ".about", ".overview", ".facility-info", ".venue-details",
+    "main", ".main-content", "#main", ".content",
+
+    "a.project"
+]
+# One selector list: soupsieve matches all of them in a single walk, in document order, each node once
+CANDIDATE_SELECTOR = ", ".join(CANDIDATE_SELECTORS)
+
+# Characters of a block that make it into its prompt (see build_block_prompt)
+BLOCK_PROMPT_CHARS = 4000
+
+def prune_nested_blocks(blocks: list[dict], window: int = BLOCK_PROMPT_CHARS) -> list[dict]:
+    """
+    Drop candidate blocks whose text is already sent through another, higher-scoring block.
+
+    Blocks are taken best score first (document order on ties):
+      - a block inside a kept ancestor is dropped, if that ancestor fits in the
+        prompt window (a longer one is truncated, so it does not cover its children)
+      - a block whose kept descendants already hold most (80%) of its text is dropped
+
+    Returns the kept blocks sorted by score.
+    """
+    kept = []
+    covering = set()   # ids of kept nodes whose whole text fits in one prompt
+    inner_chars = {}   # id(node) -> text length of kept blocks inside it
+    for b in sorted(blocks, key=lambda b: b["score"], reverse=True):
+        n = b["node"]
+        parents = list(n.parents)
+        if any(id(p) in covering for p in parents):
+            continue
+        if inner_chars.get(id(n), 0) >= 0.8 * len(b["text"]):
+            continue
+        kept.append(b)
+        if len(b["text"]) <= window:
+            covering.add(id(n))
+        for p in parents:
+            inner_chars[id(p)] = inner_chars.get(id(p), 0) + len(b["text"])
+    return kept
 
 def extract_candidate_blocks(soup: BeautifulSoup, base_url: str):
     """Generic card/list/grid blocks likely representing listings, with local images."""
-    selectors = [
-        ".card", ".listing", "article", ".event", ".tile", ".result",
-        "ul li", "ol li", ".grid > div", ".row > .col",
-        
-        # Venue focused selectors 
-        ".venue", ".location", ".facility", ".center", ".club", 
-        ".playground", ".attraction", "[class*=venue]", "[class*=location]",
-        ".about", ".overview", ".facility-info", ".venue-details",
-        "main", ".main-content", "#main", ".content",
-
-        "a.project"
-    ]
     bad = re.compile(r"(footer|header|nav|subscribe|breadcrumb|cookie|newsletter|promo|share)", re.I)
 
-    nodes = []
-    for sel in selectors:
-        nodes.extend(soup.select(sel))
-    seen = set()
-    uniq = []
-    for n in nodes:
+    blocks = []
+    for n in soup.select(CANDIDATE_SELECTOR):
         cls = " ".join(n.get("class") or [])
         if bad.search(cls):
             continue
-        if id(n) not in seen:
-            seen.add(id(n))
-            uniq.append(n)
-    
-    blocks = []
-    for n in uniq:
-        text = re.sub(r"\s+", " ", n.get_text(" ", strip=True))
+        # Text and scoring features come from a single walk of the node
+        features = card_features(n)
+        text = features[0]
         if len(text) >= 10 and is_relevant_content(text):
-            # Get images specific to this block
-            block_images = images_from_node(n, base_url)
             blocks.append({
-                "html": str(n),
-                "images": block_images,
-                "score": score_card_html(str(n)),
+                "node": n,
+                "score": score_card_node(n, features),
                 "text": text  # Store text for easier access
             })
 
+    total = len(blocks)
+    blocks = prune_nested_blocks(blocks)[:40]
 
-    blocks.sort(key=lambda b: b["score"], reverse=True)
+    # Serialize and collect images only for the blocks we keep
+    for b in blocks:
+        n = b.pop("node")
+        b["html"] = str(n)
+        # Get images specific to this block
+        b["images"] = images_from_node(n, base_url)
     
-    print(f"[debug] Found {len(blocks)} candidate blocks (top 3 shown)", file=sys.stderr)
+    print(f"[debug] Found {total} candidate blocks, {len(blocks)} kept after dropping nested ones (top 3 shown)",
+          file=sys.stderr)
     for i, b in enumerate(blocks[:3]):
         preview = b["text"][:200]
         print(f"[debug] Block {i+1} preview: {preview}...", file=sys.stderr)
         print(f"[debug] Block {i+1} images: {len(b['images'])} images", file=sys.stderr)
 
-    return blocks[:40]
+    return blocks
+
+_HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+_SECTION_TAGS = {"p", "div", "section", "article", "li"}
 
 def extract_heading_groups(soup: BeautifulSoup, base_url: str):
-    """Heading + nearby description + images near that heading section."""
+    """Heading + nearby description + images near that heading section.
+
+    One document-order walk: every element belongs to the section of the last
+    heading before it, which is what scanning find_all_next() up to the next
+    heading gave, without rescanning the rest of the page for each heading.
+    """
     groups = []
-    heads = soup.find_all(["h1","h2","h3","h4"])
-    
-    for h in heads:
-        title = re.sub(r"\s+"," ", h.get_text(" ", strip=True))
-        if not title:
+    sections = []
+    current = None
+    for el in soup.find_all(True):
+        if el.name in _HEADING_TAGS:
+            # Every heading ends the previous section, even one without text
+            title = re.sub(r"\s+"," ", el.get_text(" ", strip=True))
+            current = {"heading": el, "title": title, "parts": []} if title else None
+            if current:
+                sections.append(current)
             continue
-
-        desc_parts = []
-        for sib in h.find_all_next():
-            if sib is h:
-                continue
-            if sib.name in ["h1","h2","h3","h4"]:
-                break
-            if sib.name in ["p","div","section","article","li"]:
-                t = re.sub(r"\s+"," ", sib.get_text(" ", strip=True))
-                if len(t) >= 40:
-                    desc_parts.append(t)
-            if len(desc_parts) >= 4:
-                break
-
-        if not desc_parts:
+        if current is None or len(current["parts"]) >= 4:
+            continue
+        if el.name in _SECTION_TAGS:
+            t = re.sub(r"\s+"," ", el.get_text(" ", strip=True))
+            if len(t) >= 40:
+                current["parts"].append(t)
+
+    images_of = NodeImages(soup, base_url)
+    for sec in sections:
+        if not sec["parts"]:
             continue
 
-        full_text = title + "\n" + "\n".join(desc_parts)
+        h = sec["heading"]
+        full_text = sec["title"] + "\n" + "\n".join(sec["parts"])
         # Get images specific to this heading group
-        imgs = images_near_heading(h, base_url, max_siblings=8)
+        imgs = images_near_heading(h, base_url, max_siblings=8, images_of=images_of)
 
         # Split into smaller logical sections
         for section in split_sections(full_text):
@@ -627,13 +670,17 @@ def extract_heading_groups(soup: BeautifulSoup, base_url: str):
 
     return groups[:40]
 
-def extract_content(html: str, base_url: str):
-    soup = BeautifulSoup(html, "html.parser")
+def as_document(html, base_url: str = "") -> PageDocument:
+    """Accept either raw HTML or an already parsed PageDocument."""
+    return html if isinstance(html, PageDocument) else PageDocument(html, base_url)
+
+def extract_content(html, base_url: str):
+    doc = as_document(html, base_url)
     return {
-        "title": (soup.title.string.strip() if soup.title and soup.title.string else ""),
-        "jsonld_raw": find_jsonld_events(soup),
-        "blocks": extract_candidate_blocks(soup, base_url),
-        "heading_groups": extract_heading_groups(soup, base_url),
+        "title": doc.title,
+        "jsonld_raw": [raw for raw in doc.jsonld_raw if "Event" in raw],
+        "blocks": extract_candidate_blocks(doc.soup, base_url),
+        "heading_groups": extract_heading_groups(doc.soup, base_url),
     }
 
 def is_relevant_content(text) -> bool:
@@ -645,48 +692,22 @@ def is_relevant_content(text) -> bool:
         return False 
     return True
 
-def build_projects_prompt(project_nodes, page_url):
-    blocks_text = "\n\n".join([str(node) for node in project_nodes])
-    instr = INSTRUCTIONS.replace("{SCHEMA}", json.dumps(SCHEMA, ensure_ascii=False))
-    venue_focus_instructions = load_venue()
-
-    return (
-        instr + venue_focus_instructions
-        + "\nSOURCE_URL:\n" + page_url
-        +  "IMPORTANT: Each block may contain MULTIPLE individual events. Extract ALL listings separately."
-          "Only extract venues explicitly visible in these blocks. "
-          "Do not invent or include any other parks, attractions, or events not in the block."
-        + "\nNOTE: Do NOT replace the URL with links found in the block. "
-        + "Use the SOURCE_URL for both 'guid' and 'url'.\n"
-        + "\nBLOCK:\n" + blocks_text[:150000]
-        + "\nIMPORTANT: You must include these BLOCK_IMAGES in the 'images' field of each output object. "
-        + "Each image must be an object with {url, source_credit}, where source_credit = organiser name.\n"
-        + "\nOUTPUT:\nReturn only the JSON array. "
-          "RULES: Extract any activities, attractions, playgrounds, or events that families, kids, or parents might attend. "
-          "Never invent festivals, runs, or other events unless shown verbatim. "
-          "If fields are missing, leave them null."
-    )
-
-
 def build_block_prompt(block_text: str, page_url: str, block_images: list[str]) -> str:
     price_info = extract_price(block_text)
-    instr = INSTRUCTIONS.replace("{SCHEMA}", json.dumps(SCHEMA, ensure_ascii=False))
 
     price_hint = ""
     if price_info.get("price") is not None:
         price_hint = f"\nEXTRACTED_PRICE_INFO:\n{json.dumps(price_info, ensure_ascii=False)}"
 
-    venue_focus_instructions = load_venue()
-
+    # PROMPT_PREFIX (instructions + schema + venue rules) is sent separately by call_gemini_json
     return (
-        instr + venue_focus_instructions
-        + "\nSOURCE_URL:\n" + page_url
+        "\nSOURCE_URL:\n" + page_url
         + "\nIMPORTANT: Extract ALL separate venues or events from this block. "
         + "Do not merge events. Return one JSON object per event. "
         + "If multiple venues are shown, extract each separately.\n"
         + "\nNOTE: Do NOT replace the URL with links found in the block. "
         + "Use the SOURCE_URL for both 'guid' and 'url'.\n"
-        + "\nBLOCK:\n" + block_text[:4000]  # 📌 NOT 4000
+        + "\nBLOCK:\n" + block_text[:BLOCK_PROMPT_CHARS]
         + "\nBLOCK_IMAGES:\n" + json.dumps(block_images or [], ensure_ascii=False)[:2000]
         + "\nIMPORTANT: You must include these BLOCK_IMAGES in the 'images' field of each output object. "
         + "Each image must be an object with {url, source_credit}, where source_credit = organiser name.\n"
@@ -697,6 +718,36 @@ def build_block_prompt(block_text: str, page_url: str, block_images: list[str])
           "If fields are missing, leave them null."
     )
 
+def build_cards_prompt(cards: list[tuple[int, str, list[str]]], page_url: str, max_chars: int = 4000) -> str:
+    """One prompt for several cards; each card is labelled with its source index so items can be mapped back."""
+    parts = []
+    for idx, content, images in cards:
+        price_info = extract_price(content)
+        part = (
+            f"\nCARD {idx}:\n" + content[:max_chars]
+            + f"\nCARD {idx} IMAGES:\n" + json.dumps(images or [], ensure_ascii=False)[:2000]
+        )
+        if price_info.get("price") is not None:
+            part += f"\nCARD {idx} EXTRACTED_PRICE_INFO:\n{json.dumps(price_info, ensure_ascii=False)}"
+        parts.append(part)
+
+    # PROMPT_PREFIX (instructions + schema + venue rules) is sent separately by call_gemini_json
+    return (
+        "\nSOURCE_URL:\n" + page_url
+        + "\nIMPORTANT: The CARDS below are separate listings. Extract ALL separate venues or events from each card. "
+        + "Do not merge events across cards. Return one JSON object per event.\n"
+        + "Every output object MUST include an integer field \"_card\" with the number of the CARD it came from.\n"
+        + "\nNOTE: Do NOT replace the URL with links found in the cards. "
+        + "Use the SOURCE_URL for both 'guid' and 'url'.\n"
+        + "\nCARDS:" + "".join(parts)
+        + "\nIMPORTANT: You must include each card's IMAGES in the 'images' field of the objects from that card. "
+        + "Each image must be an object with {url, source_credit}, where source_credit = organiser name.\n"
+        + "\nOUTPUT:\nReturn only the JSON array. "
+          "RULES: Extract any activities, attractions, playgrounds, or events that families, kids, or parents might attend. "
+          "Never invent festivals, runs, or other events unless shown verbatim. "
+          "If fields are missing, leave them null."
+    )
+
 def split_sections(text: str) -> list[str]:
     sections = []
     current = []
@@ -720,35 +771,84 @@ except (KeyError, ValueError) as e:
     client = None
     MODEL_NAME = None
 
-def call_gemini_json(prompt: str):
+PREFIX_CACHE = CachedPrefix(
+    client, MODEL_NAME, PROMPT_PREFIX,
+    ttl_seconds=int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")),
+) if client else None
+
+GEMINI_CONFIG = {"temperature": 0.0, "response_mime_type": "application/json"}
+GOVERNOR = get_governor()
+# The prompt passed to call_gemini_json is only the suffix, so the response cache key includes the prefix
+GEMINI_CACHE_CONFIG = {
+    **GEMINI_CONFIG,
+    "system_instruction_sha256": hashlib.sha256(PROMPT_PREFIX.encode("utf-8")).hexdigest(),
+}
+
+def parse_gemini_json(text: str) -> list:
+    objs = json.loads(text)
+    if isinstance(objs, dict):
+        return [objs]
+    if isinstance(objs, list):
+        return objs
+    return []
+
+def call_gemini_json(prompt: str, raise_errors: bool = False):
+    """Send `prompt` (after PROMPT_PREFIX) and return the parsed list of objects.
+
+    Errors are logged and give [] unless `raise_errors` is set, for callers that
+    need to tell a failed call from an empty answer. When Gemini itself is
+    unavailable (circuit open, retries exhausted) the error is always raised, so
+    the page is reported as failed instead of silently having no items.
+    """
     if not client or not MODEL_NAME:
         print("[debug] Gemini client not initialized. Skipping API call.", file=sys.stderr)
+        if raise_errors:
+            raise RuntimeError("Gemini client not initialized")
         return []
 
     try:
+        cache = get_gemini_cache()
+        cache_key = cache.make_key(MODEL_NAME, GEMINI_CACHE_CONFIG, prompt)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f"[debug] Gemini cache hit for prompt (first 100 chars): {prompt[:100]}...", file=sys.stderr)
+            return parse_gemini_json(cached)
+
         print(f"[debug] Calling Gemini with prompt (first 300 chars): {prompt[:300]}...", file=sys.stderr)
 
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt,
-            config=genai.types.GenerateContentConfig(
-                temperature=0.0,
-                response_mime_type="application/json",
-            ),
-        )
+        def generate():
+            try:
+                return client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=prompt,
+                    config=PREFIX_CACHE.config(**GEMINI_CONFIG),
+                )
+            except genai_errors.ClientError as e:
+                if e.code not in (403, 404):
+                    raise
+                # Context cache expired or was deleted server-side: recreate it and try once more
+                PREFIX_CACHE.invalidate()
+                return client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=prompt,
+                    config=PREFIX_CACHE.config(**GEMINI_CONFIG),
+                )
+
+        # Rate limits, retries with backoff and the circuit breaker are shared with every other caller
+        response = GOVERNOR.call(MODEL_NAME, generate, tokens=estimate_tokens(prompt))
 
         text = (response.text or "").strip()
         print(f"[debug] Gemini response (first 300 chars): {text[:300]}...", file=sys.stderr)
 
-        objs = json.loads(text)
-        if isinstance(objs, dict):
-            return [objs]
-        if isinstance(objs, list):
-            return objs
-        return []
+        objs = parse_gemini_json(text)
+        # Only cache answers that parsed, so a bad response is retried next run
+        cache.put(cache_key, MODEL_NAME, text)
+        return objs
 
     except Exception as e:
         print(f"[debug] Error calling Gemini: {e}", file=sys.stderr)
+        if raise_errors or is_unavailable(e):
+            raise
         return []
 
 
@@ -805,26 +905,30 @@ def is_valid_item(obj, keywords):
 
     return True
 
+# Address patterns, most specific first. None of them crosses a "." or line break
+# (except the whitespace before a postcode), so every match starts where a
+# segment starts; anchoring them there keeps the lazy prefixes from rescanning
+# long lines from every position.
+_SEGMENT_START = r"(?<![^.\n])"
+ADDRESS_PATTERNS = [re.compile(_SEGMENT_START + p, re.IGNORECASE) for p in (
+    # Complete address with postal code
+    r'([^.\n]*?Singapore\s+\d{6}[^.\n]*)',
+    # Address ending with Singapore + postal
+    r'([^.\n]*?\d{6}\s+Singapore[^.\n]*)',
+    # Street address with Singapore
+    r'([^.\n]*?(?:Street|Road|Avenue|Drive|Lane|Walk|Park|Plaza|Centre|Building)[^.\n]*?Singapore[^.\n]*)',
+    # Any line containing Singapore and numbers (likely postal)
+    r'([^.\n]*?Singapore[^.\n]*?\d{6}[^.\n]*)',
+)]
+
 def extract_full_address_from_text(text):
     """Extract Singapore address with multiple fallback patterns."""
-    if not text:
+    # Every pattern needs "Singapore"
+    if not text or "singapore" not in text.lower():
         return None
-    
-    # Pattern 1: Full address with postal code
-    patterns = [
-        # Complete address with postal code
-        r'([^.\n]*?Singapore\s+\d{6}[^.\n]*)',
-        # Address ending with Singapore + postal
-        r'([^.\n]*?\d{6}\s+Singapore[^.\n]*)',
-        # Street address with Singapore
-        r'([^.\n]*?(?:Street|Road|Avenue|Drive|Lane|Walk|Park|Plaza|Centre|Building)[^.\n]*?Singapore[^.\n]*)',
-        # Any line containing Singapore and numbers (likely postal)
-        r'([^.\n]*?Singapore[^.\n]*?\d{6}[^.\n]*)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE | re.MULTILINE)
-        for match in matches:
+
+    for pattern in ADDRESS_PATTERNS:
+        for match in pattern.finditer(text):
             addr = match.group(1).strip()
             # Clean up the address
             addr = re.sub(r'\s+', ' ', addr)
@@ -835,23 +939,23 @@ def extract_full_address_from_text(text):
     return None
 
 def extract_full_address(html):
-    """More comprehensive address extraction from entire HTML."""
-    soup = BeautifulSoup(html, "html.parser")
-    
+    """More comprehensive address extraction from entire HTML (or a PageDocument)."""
+    if isinstance(html, str) and "<" not in html:
+        # Plain text (e.g. an item's source text): nothing to parse, the text is the page text
+        return extract_full_address_from_text(html.strip())
+
+    doc = as_document(html)
+
     # Try structured data first
-    for script in soup.find_all("script", type="application/ld+json"):
-        try:
-            data = json.loads(script.string)
-            if isinstance(data, dict):
-                # Look for address in structured data
-                addr = data.get("address")
-                if addr:
-                    return str(addr) if isinstance(addr, str) else json.dumps(addr)
-        except:
-            pass
+    for data in doc.jsonld:
+        if isinstance(data, dict):
+            # Look for address in structured data
+            addr = data.get("address")
+            if addr:
+                return str(addr) if isinstance(addr, str) else json.dumps(addr)
     
     # Try contact/address sections
-    address_sections = soup.find_all(["div", "section", "p"], 
+    address_sections = doc.soup.find_all(["div", "section", "p"], 
                                    class_=re.compile(r"address|contact|location", re.I))
     
     for section in address_sections:
@@ -860,24 +964,15 @@ def extract_full_address(html):
             return addr
     
     # Fallback to full page text
-    full_text = soup.get_text("\n", strip=True)
-
-    return extract_full_address_from_text(full_text)
+    return extract_full_address_from_text(doc.text)
 
 def global_address(html):
-    text = BeautifulSoup(html, "html.parser").get_text("\n", strip=True)
-    line_match = re.search(r".{0,100}(Singapore\s*\d{6}).{0,100}", text, re.I)
-    if line_match:
-        # Get the whole line (not just the postal code)
-        line = line_match.group(0)
-        # Clean multiple spaces
-        return re.sub(r"\s+", " ", line).strip()
+    """First "Singapore 123456" line on the page (from the page's address index)."""
+    return as_document(html).addresses.page_line
 
-    return None
-
-def get_fallback_images(html: str, base_url: str) -> list[str]:
+def get_fallback_images(html, base_url: str) -> list[str]:
     """Extract fallback images from the entire page."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_document(html, base_url).soup
     
     # Look for main content images
     main_selectors = ["main img", ".main-content img", "#content img", "article img"]
@@ -937,427 +1032,445 @@ def save_id(last_id: int):
     with open(tracker_path, "w") as f:
           f.write(str(last_id))
     
-def main():
-    try:
-        all_items = []
-        processed_sources = [] 
-        url = sys.argv[1] if len(sys.argv) > 1 else input("Enter URL: ").strip()
-        if not url:
-            print("[]")
-            return
-
-        print(f"[debug] Fetching URL: {url}", file=sys.stderr)
-        html = fetch_html(url)
-
-        print(f"[debug] HTML fetched, length: {len(html)} chars", file=sys.stderr)
+GEMINI_EXECUTOR = GeminiExecutor(
+    max_workers=int(os.getenv("GEMINI_WORKERS", "4")),
+    max_inflight_tokens=int(os.getenv("GEMINI_INFLIGHT_TOKENS", "200000")),
+)
+
+def call_gemini_many(prompts: list[str]) -> list:
+    """call_gemini_json for every prompt on the shared worker pool; results keep prompt order."""
+    if not prompts:
+        return []
+    return GEMINI_EXECUTOR.map(call_gemini_json, prompts, default=[], fatal=is_unavailable)
 
+def build_each(sources: list, build, label: str) -> list[tuple[int, object]]:
+    """(index, build(source)) per source; one that raises is logged and skipped instead of failing the whole section."""
+    built = []
+    for i, source in enumerate(sources):
         try:
-            ctx = extract_content(html, base_url=url)
-            blocks = fetch_blocks(url)
-            print(f"[debug] Found {len(blocks)} candidate blocks", file=sys.stderr)
-            # Custom handling for Gowhere project cards using data-index elements
-            if blocks:
-                print(f"[debug] Processing {len(blocks)} Gowhere event blocks", file=sys.stderr)
-
-                for i, block in enumerate(blocks):
-                    try:
-                        block_text = block.get("text", "")
-                        block_html = block.get("html", "")
-                        block_images = images_from_node(BeautifulSoup(block_html, "html.parser"), url)
-
-                        print(f"[debug] Processing Gowhere block {i+1}: {block_text[:120]}...", file=sys.stderr)
-
-                        # Build prompt from block text + images
-                        prompt = build_block_prompt(block_html, url, block_images)
-                        arr = call_gemini_json(prompt)
-
-                        if isinstance(arr, list) and arr:
-                            for item in arr:
-                                if isinstance(item, dict):
-                                    item["_source_type"] = "gowhere_block"
-                                    item["_source_index"] = i
-                                    item["_source_images"] = block_images
-                                    item["_source_text"] = block_text
-                            all_items.extend(arr)
-                        else:
-                            print(f"[debug] Gowhere block {i+1} returned no valid items", file=sys.stderr)
-
-                    except Exception as e:
-                        print(f"[debug] Error processing Gowhere block {i+1}: {e}", file=sys.stderr)
-                        continue
-
+            built.append((i, build(source)))
         except Exception as e:
-            print(f"Error extracting content from {url}: {e}", file=sys.stderr)
-            print("[]")
-            blocks = []
-        # #print
-        #     f"[debug] title={ctx['title']!r} "
-        #     f"jsonld={len(ctx['jsonld_raw'])} "
-        #     f"blocks={len(ctx['blocks'])} "
-        #     f"heads={len(ctx['heading_groups'])}",file=sys.stderr
+            print(f"[debug] Error processing {label} {i+1}: {e}", file=sys.stderr)
+    return built
+
+def tag_items(arr: list, source_type: str, index: int, images: list, text: str):
+    """Remember which source produced each item, for the post-processing step."""
+    for item in arr:
+        if isinstance(item, dict):
+            item["_source_type"] = source_type
+            item["_source_index"] = index
+            item["_source_images"] = images
+            item["_source_text"] = text
+
+BATCH_TOKEN_BUDGET = int(os.getenv("GEMINI_BATCH_TOKENS", "8000"))
+
+def extract_cards_batched(cards: list[tuple[str, str, list[str]]], url: str, source_type: str,
+                          max_chars: int = 4000) -> list[dict]:
+    """
+    Extract items from many cards with as few Gemini requests as the token budget allows.
+
+    Args:
+        cards: (prompt content, plain text, images) per card, in source order
+        url: Page URL
+        source_type: `_source_type` recorded on the items
+        max_chars: Per-card cap on the content sent to the model
+
+    Returns:
+        Items tagged with the index, images and text of the card they came from
+    """
+    batches = pack_by_tokens([c[0][:max_chars] for c in cards], BATCH_TOKEN_BUDGET)
+    print(f"[debug] Packed {len(cards)} {source_type} cards into {len(batches)} requests", file=sys.stderr)
+
+    def call_batches(pending):
+        prompts = [
+            build_cards_prompt([(i, cards[i][0], cards[i][2]) for i in batch], url, max_chars)
+            for batch in pending
+        ]
+        # None marks a failed call or an unparseable answer, so only that batch is split and retried
+        # Splitting cannot help while Gemini is unavailable, so that error ends the whole extraction
+        return GEMINI_EXECUTOR.map(lambda p: call_gemini_json(p, raise_errors=True), prompts, default=None,
+                                   fatal=is_unavailable)
+
+    items = []
+    pending = batches
+    while pending:
+        rerun = []
+        for batch, arr in run_batches(pending, call_batches):
+            found = [(item, source_index_of(item, batch)) for item in arr if isinstance(item, dict)]
+            if any(idx is None for _, idx in found):
+                # The model did not say which card an item came from; guessing would attach the wrong images
+                print(f"[debug] Batch of {len(batch)} cards returned unattributed items, retrying per card",
+                      file=sys.stderr)
+                rerun.extend([i] for i in batch)
+                continue
+            for item, idx in found:
+                tag_items([item], source_type, idx, cards[idx][2], cards[idx][1])
+                items.append(item)
+        # Single-card batches always attribute their items, so this ends after one retry round
+        pending = rerun
+    items.sort(key=lambda item: item["_source_index"])
+    return items
+
+def extract_items(url: str, html: str, blocks: list[dict]) -> list[dict]:
+    """Run every extraction strategy over a fetched page and return the cleaned, deduplicated items."""
+    all_items = []
+    processed_sources = [] 
+
+    # Parsed once; every extractor below shares this tree, its text and its JSON-LD
+    doc = PageDocument(html, url)
 
- # Track which content sources we've processed
-        soup = BeautifulSoup(html,"html.parser")
+    try:
+        ctx = extract_content(doc, base_url=url)
+        print(f"[debug] Found {len(blocks)} candidate blocks", file=sys.stderr)
+        # Custom handling for Gowhere project cards using data-index elements
+        if blocks:
+            print(f"[debug] Processing {len(blocks)} Gowhere event blocks", file=sys.stderr)
+
+            cards = [card for _, card in build_each(blocks, lambda block: (
+                block.get("html", ""),
+                block.get("text", ""),
+                images_from_node(BeautifulSoup(block.get("html", ""), "html.parser"), url),
+            ), "Gowhere block")]
+
+            gowhere_items = extract_cards_batched(cards, url, "gowhere_block")
+            print(f"[debug] Gowhere blocks returned {len(gowhere_items)} items", file=sys.stderr)
+            all_items.extend(gowhere_items)
 
-       # ADD ONE SELECTORS DEPENDING ON WEBSITE IF IT HAS A WEIRD STRUCTURE w no blocs/headings
-       #a.project for playpoint
-        # In the projects section, try this selector instead:
-        # Gowhere-compatible project/event card selectors
-        projects = soup.select("div[data-index]")
+    except Exception as e:
+        if is_unavailable(e):
+            raise
+        print(f"Error extracting content from {url}: {e}", file=sys.stderr)
+        print("[]")
+        blocks = []
+    # #print
+    #     f"[debug] title={ctx['title']!r} "
+    #     f"jsonld={len(ctx['jsonld_raw'])} "
+    #     f"blocks={len(ctx['blocks'])} "
+    #     f"heads={len(ctx['heading_groups'])}",file=sys.stderr
 
+ # Track which content sources we've processed
+    soup = doc.soup
 
-        if not projects:
-            projects = soup.select(".project") 
-        if not projects:
-            projects = soup.select("[class*='project']")
+   # ADD ONE SELECTORS DEPENDING ON WEBSITE IF IT HAS A WEIRD STRUCTURE w no blocs/headings
+   #a.project for playpoint
+    # In the projects section, try this selector instead:
+    # Gowhere-compatible project/event card selectors
+    projects = soup.select("div[data-index]")
 
-        print(f"[debug] Found {len(projects)} project elements with improved selectors", file=sys.stderr)
 
-        print(f"[debug] Found {len(projects)} <a.project> elements", file=sys.stderr)
+    if not projects:
+        projects = soup.select(".project") 
+    if not projects:
+        projects = soup.select("[class*='project']")
 
-        "---PROJECTS PROCESSSING---"
-        if projects:
-            print(f"[debug] Processing {len(projects)} project cards individually", file=sys.stderr)
-            
-            for i, project in enumerate(projects):
-                try:
-                    # Extract images from this specific project
-                    project_images = images_from_node(project, url)
-                    project_text = re.sub(r"\s+", " ", project.get_text(" ", strip=True))
-                    
-                    print(f"[debug] Processing project {i+1}/{len(projects)}: {project_text[:100]}...", file=sys.stderr)
-                    
-                    # Create individual prompt for this project
-                    individual_prompt = build_projects_prompt([project], url)
-                    
-                    # Call Gemini for this specific project
-                    arr = call_gemini_json(individual_prompt)
-                    print(f"[debug] Raw arr result: {arr}", file=sys.stderr)
-                    print(f"[debug] Type: {type(arr)}, Length: {len(arr) if hasattr(arr, '__len__') else 'N/A'}", file=sys.stderr)
-
-                    if isinstance(arr, list) and len(arr) > 0:
-                        print(f"[debug] Project {i+1} returned {len(arr)} items", file=sys.stderr)
-                        # ... rest of your code
-    
-                        
-                        # Add source tracking and images to each item
-                        for item in arr:
-                            if isinstance(item, dict):
-                                item["_source_type"] = "project"
-                                item["_source_index"] = i
-                                item["_source_images"] = project_images
-                                item["_source_text"] = project_text
-                        
-                        all_items.extend(arr)
-                    else:
-                        print(f"[debug] Project {i+1} validation failed - arr is not a non-empty list", file=sys.stderr)
-        
-                        
-                except Exception as e:
-                    print(f"[debug] Error processing project {i+1}: {e}", file=sys.stderr)
-                    continue
-                    
-            print(f"[debug] Total items from projects: {len(all_items)}", file=sys.stderr)
-            
-            # If we still don't have enough items, try batch processing as fallback
-            if len(all_items) < len(projects):
-                print(f"[debug] Only got {len(all_items)} items from {len(projects)} projects, trying batch processing", file=sys.stderr)
-                
-                # Split projects into smaller batches to avoid token limits
-                batch_size = 5
-                for batch_start in range(0, len(projects), batch_size):
-                    batch_end = min(batch_start + batch_size, len(projects))
-                    batch_projects = projects[batch_start:batch_end]
-                    
-                    try:
-                        batch_prompt = build_projects_prompt(batch_projects, url)
-                        batch_arr = call_gemini_json(batch_prompt)
-                        
-                        if isinstance(batch_arr, list) and len(batch_arr) > 0:
-                            print(f"[debug] Batch {batch_start//batch_size + 1} returned {len(batch_arr)} items", file=sys.stderr)
-                            
-                            for item in batch_arr:
-                                if isinstance(item, dict):
-                                    item["_source_type"] = "project_batch"
-                                    item["_source_index"] = batch_start
-                                    item["_source_images"] = []  
-                                    item["_source_text"] = ""
-                            
-                            all_items.extend(batch_arr)
-                            
-                    except Exception as e:
-                        print(f"[debug] Error processing batch {batch_start//batch_size + 1}: {e}", file=sys.stderr)
+    print(f"[debug] Found {len(projects)} project elements with improved selectors", file=sys.stderr)
 
-        else:
-            if "semec.com.sg/public-residences" in url:
-                # top_items = soup.select("div.item-link-wrapper[data-hook='item-link-wrapper']")
-                # for i, item in enumerate(top_items):
-                #     img_url = None
-
-                #     img_tag = item.find("img")
-                #     if img_tag:
-                #         img_url = img_tag.get("src") or img_tag.get("data-src")
-                #     elif item.get("style"):
-                #         match = re.search(r'url\(["\']?(.*?)["\']?\)', item["style"])
-                #         if match:
-                #             img_url = match.group(1)
-
-                #     if img_url:
-                #         playground_title = f"Public Playground {i+1}"
-                #         block_text = f"Venue Name: {playground_title}\nCategory: Outdoor Playground\nDescription: Public playground with SEMEC equipment."
-                #         arr = call_gemini_json(build_block_prompt(block_text, url, [img_url]))
-                #         if isinstance(arr, list):
-                #             for obj in arr:
-                #                 obj["_source_type"] = "semec_top"
-                #                 obj["_source_index"] = i
-                #                 obj["_source_images"] = [img_url]
-                #             all_items.extend(arr)
-                wix_items = soup.select("a.item-link-wrapper[data-hook='item-link-wrapper']")
-                park_links = [_ensure_url(item.get("href"), url) for item in wix_items if item.get("href")]
-
-                # Step 2: loop each park page
-                for i, park_url in enumerate(park_links):
-                    park_title = park_url.rstrip("/").split("/")[-1].replace("-", " ").title()
-                    img_urls = scrape_park_images(park_url)
-
-                    block_text = f"Venue Name: {park_title}\nCategory: Outdoor Playground\nDescription: Public playground with SEMEC equipment."
-                    arr = call_gemini_json(build_block_prompt(block_text, park_url, img_urls))
-
-                    if isinstance(arr, list) and arr:
-                        for obj in arr:
-                            obj["_source_type"] = "semec_individual"
-                            obj["_source_index"] = i
-                            obj["_source_url"] = park_url
-                            obj["_source_images"] = img_urls
-                        all_items.extend(arr)
+    "---PROJECTS PROCESSSING---"
+    if projects:
+        print(f"[debug] Processing {len(projects)} project cards", file=sys.stderr)
 
- 
-        #FALLBACK TO headings, candidate, jsload blocks 
+        # Images are taken from each specific project
+        cards = [card for _, card in build_each(projects, lambda project: (
+            str(project),
+            re.sub(r"\s+", " ", project.get_text(" ", strip=True)),
+            images_from_node(project, url),
+        ), "project")]
 
-         # Get fallback images for items that don't have images
-        fallback_images = get_fallback_images(html, url)
-        print(f"[debug] Found {len(fallback_images)} fallback images", file=sys.stderr)
+        # Project cards are raw HTML, so they get a much larger per-card allowance
+        project_items = extract_cards_batched(cards, url, "project", max_chars=150000)
+        print(f"[debug] Total items from projects: {len(project_items)}", file=sys.stderr)
+        all_items.extend(project_items)
 
+    else:
+        if "semec.com.sg/public-residences" in url:
+            # top_items = soup.select("div.item-link-wrapper[data-hook='item-link-wrapper']")
+            # for i, item in enumerate(top_items):
+            #     img_url = None
+
+            #     img_tag = item.find("img")
+            #     if img_tag:
+            #         img_url = img_tag.get("src") or img_tag.get("data-src")
+            #     elif item.get("style"):
+            #         match = re.search(r'url\(["\']?(.*?)["\']?\)', item["style"])
+            #         if match:
+            #             img_url = match.group(1)
+
+            #     if img_url:
+            #         playground_title = f"Public Playground {i+1}"
+            #         block_text = f"Venue Name: {playground_title}\nCategory: Outdoor Playground\nDescription: Public playground with SEMEC equipment."
+            #         arr = call_gemini_json(build_block_prompt(block_text, url, [img_url]))
+            #         if isinstance(arr, list):
+            #             for obj in arr:
+            #                 obj["_source_type"] = "semec_top"
+            #                 obj["_source_index"] = i
+            #                 obj["_source_images"] = [img_url]
+            #             all_items.extend(arr)
+            wix_items = soup.select("a.item-link-wrapper[data-hook='item-link-wrapper']")
+            park_links = [_ensure_url(item.get("href"), url) for item in wix_items if item.get("href")]
+
+            # Step 2: loop each park page
+            park_images = []
+            prompts = []
+            for park_url in park_links:
+                park_title = park_url.rstrip("/").split("/")[-1].replace("-", " ").title()
+                img_urls = scrape_park_images(park_url)
+                park_images.append(img_urls)
+
+                block_text = f"Venue Name: {park_title}\nCategory: Outdoor Playground\nDescription: Public playground with SEMEC equipment."
+                prompts.append(build_block_prompt(block_text, park_url, img_urls))
+
+            for i, arr in enumerate(call_gemini_many(prompts)):
+                if isinstance(arr, list) and arr:
+                    for obj in arr:
+                        obj["_source_type"] = "semec_individual"
+                        obj["_source_index"] = i
+                        obj["_source_url"] = park_links[i]
+                        obj["_source_images"] = park_images[i]
+                    all_items.extend(arr)
+
+ 
+    #FALLBACK TO headings, candidate, jsload blocks 
+
+     # Get fallback images for items that don't have images
+    fallback_images = get_fallback_images(doc, url)
+    print(f"[debug] Found {len(fallback_images)} fallback images", file=sys.stderr)
+
+    if not all_items:
+        print("[debug] No items from projects, falling back to heading/block extraction", file=sys.stderr)
+
+        # 1) Always try heading groups first (venue-first extraction)
+        groups = ctx.get("heading_groups", [])
+        print(f"[debug] Extracting venues from {len(groups)} heading groups", file=sys.stderr)
+        built = build_each(groups, lambda g: build_block_prompt(g["text"], url, g.get("images") or []),
+                           "heading group")
+        for (i, _), arr in zip(built, call_gemini_many([prompt for _, prompt in built])):
+            if isinstance(arr, list) and arr:
+                # Associate each item with its source content and images
+                tag_items(arr, "heading_group", i, groups[i].get("images", []), groups[i]["text"])
+                all_items.extend(arr)
+                processed_sources.append(("heading_group", i))
+
+        # 2) Fallback: use candidate blocks if headings gave nothing or few results
+        if len(all_items) < 3:  # If we have very few items from headings
+            cands = ctx.get("blocks", [])
+            print(f"[debug] Few/no venues from headings, trying {len(cands)} candidate blocks", file=sys.stderr)
+            built = build_each(cands, lambda b: build_block_prompt(b.get("text", ""), url, b.get("images") or []),
+                               "block")
+            for (i, _), arr in zip(built, call_gemini_many([prompt for _, prompt in built])):
+                if isinstance(arr, list) and arr:
+                    # Associate each item with its source content and images
+                    tag_items(arr, "block", i, cands[i].get("images", []), cands[i].get("text", ""))
+                    all_items.extend(arr)
+                    processed_sources.append(("block", i))
+
+        # 3) Last resort: JSON-LD
         if not all_items:
-            print("[debug] No items from projects, falling back to heading/block extraction", file=sys.stderr)
-
-            # 1) Always try heading groups first (venue-first extraction)
-            print("[debug] Extracting venues from heading groups", file=sys.stderr)
-            for i, group in enumerate(ctx.get("heading_groups", [])):
-                try:
-                    print(f"[debug] Processing heading group {i+1}/{len(ctx['heading_groups'])}", file=sys.stderr)
-                    arr = call_gemini_json(
-                        build_block_prompt(group["text"], url, group.get("images") or [])
-                    )
-                    if isinstance(arr, list) and arr:
-                        # Associate each item with its source content and images
-                        for item in arr:
-                            if isinstance(item, dict):
-                                item["_source_type"] = "heading_group"
-                                item["_source_index"] = i
-                                item["_source_images"] = group.get("images", [])
-                                item["_source_text"] = group["text"]
-                        all_items.extend(arr)
-                        processed_sources.append(("heading_group", i))
-                except Exception as e:
-                    print(f"[debug] Error processing heading group {i+1}: {e}", file=sys.stderr)
-
-            # 2) Fallback: use candidate blocks if headings gave nothing or few results
-            if len(all_items) < 3:  # If we have very few items from headings
-                print("[debug] Few/no venues from headings, trying candidate blocks", file=sys.stderr)
-                for i, block in enumerate(ctx.get("blocks", [])):
-                    try:
-                        print(f"[debug] Processing candidate block {i+1}/{len(ctx['blocks'])}", file=sys.stderr)
-                        arr = call_gemini_json(
-                            build_block_prompt(block.get("text", ""), url, block.get("images") or [])
-                        )
-                        if isinstance(arr, list) and arr:
-                            # Associate each item with its source content and images
-                            for item in arr:
-                                if isinstance(item, dict):
-                                    item["_source_type"] = "block"
-                                    item["_source_index"] = i
-                                    item["_source_images"] = block.get("images", [])
-                                    item["_source_text"] = block.get("text", "")
-                            all_items.extend(arr)
-                            processed_sources.append(("block", i))
-                    except Exception as e:
-                        print(f"[debug] Error processing block {i+1}: {e}", file=sys.stderr)
-
-            # 3) Last resort: JSON-LD
-            if not all_items:
-                print("[debug] No venues from headings or blocks, trying JSON-LD", file=sys.stderr)
-                for j, raw in enumerate(ctx.get("jsonld_raw", [])):
-                    try:
-                        arr = call_gemini_json(build_block_prompt(raw, url, []))
-                        if isinstance(arr, list) and arr:
-                            for item in arr:
-                                if isinstance(item, dict):
-                                    item["_source_type"] = "jsonld"
-                                    item["_source_index"] = j
-                                    item["_source_images"] = []
-                                    item["_source_text"] = raw
-                            all_items.extend(arr)
-                            processed_sources.append(("jsonld", j))
-                    except Exception as e:
-                        print(f"[debug] Error processing JSON-LD block {j+1}: {e}", file=sys.stderr)
-
-        print(f"[debug] Total items before validation: {len(all_items)}", file=sys.stderr)
-        print(f"[debug] Processed sources: {processed_sources}", file=sys.stderr)
-
-        # IMPROVED: Better deduplication that preserves more items
-        valid = []
-        seen_venues = set()
-        seen_titles = set()
-        
-        for item in all_items:
-            if not isinstance(item, dict):
-                continue
-                
-            # Create multiple keys to check for duplicates
-            venue_name = safe_strip(item.get('venue_name', '')).lower()
-            title = safe_strip(item.get('title', '')).lower()
-            
-            # Skip if we've seen this exact venue name and title combination
-            venue_title_key = (venue_name, title)
-            if venue_title_key in seen_venues:
-                print(f"[debug] Skipping duplicate venue: {venue_name} - {title}", file=sys.stderr)
-                continue
-                
-            # Skip if we've seen this exact title and it's substantial
-            if title and len(title) > 10 and title in seen_titles:
-                print(f"[debug] Skipping duplicate title: {title}", file=sys.stderr)
-                continue
+            print("[debug] No venues from headings or blocks, trying JSON-LD", file=sys.stderr)
+            raws = ctx.get("jsonld_raw", [])
+            built = build_each(raws, lambda raw: build_block_prompt(raw, url, []), "JSON-LD block")
+            for (j, _), arr in zip(built, call_gemini_many([prompt for _, prompt in built])):
+                if isinstance(arr, list) and arr:
+                    tag_items(arr, "jsonld", j, [], raws[j])
+                    all_items.extend(arr)
+                    processed_sources.append(("jsonld", j))
+
+    print(f"[debug] Total items before validation: {len(all_items)}", file=sys.stderr)
+    print(f"[debug] Processed sources: {processed_sources}", file=sys.stderr)
+
+    # IMPROVED: Better deduplication that preserves more items
+    valid = []
+    seen_venues = set()
+    seen_titles = set()
+    
+    for item in all_items:
+        if not isinstance(item, dict):
+            continue
             
-            # If venue name exists, add to venue set
-            if venue_name:
-                seen_venues.add(venue_title_key)
-                
-            # If title is substantial, add to title set
-            if title and len(title) > 10:
-                seen_titles.add(title)
-                
-            valid.append(item)
+        # Create multiple keys to check for duplicates
+        venue_name = safe_strip(item.get('venue_name', '')).lower()
+        title = safe_strip(item.get('title', '')).lower()
         
-        print(f"[debug] Items after deduplication: {len(valid)}", file=sys.stderr)
+        # Skip if we've seen this exact venue name and title combination
+        venue_title_key = (venue_name, title)
+        if venue_title_key in seen_venues:
+            print(f"[debug] Skipping duplicate venue: {venue_name} - {title}", file=sys.stderr)
+            continue
+            
+        # Skip if we've seen this exact title and it's substantial
+        if title and len(title) > 10 and title in seen_titles:
+            print(f"[debug] Skipping duplicate title: {title}", file=sys.stderr)
+            continue
         
-        # Enhanced post-processing with better image handling
-        for i, item in enumerate(valid):
-            if isinstance(item, dict):
-                item["guid"] = url
-                item["url"] = url
-                
-                # Get the original source text for this item
-                source_text = item.get("_source_text", "")
-                source_images = item.get("_source_images", [])
-                
-                # Process pricing
-                valid[i] = merge_price_fields(item, source_text)
-                print(f"[debug] Final price for item {i+1}: {valid[i].get('price_display')}", file=sys.stderr)
-                valid[i] = enrich_free_price_fields(valid[i])
-
-
-                # Process address
-                adr = extract_full_address(source_text)
-                if not adr: 
-                    adr = global_address(html)
-                if adr: 
-                    item["address_display"] = adr
-                else: 
-                    item["address_display"] = "Not Available"
-
-                # Process operating hours
-                date_time = extract_operating_hours(source_text)
-                if date_time and not item.get("datetime_display"):
-                    item["datetime_display"] = date_time
-
-                # FIXED IMAGE HANDLING
-                current_images = item.get("images", [])
+        # If venue name exists, add to venue set
+        if venue_name:
+            seen_venues.add(venue_title_key)
+            
+        # If title is substantial, add to title set
+        if title and len(title) > 10:
+            seen_titles.add(title)
+            
+        valid.append(item)
+    
+    print(f"[debug] Items after deduplication: {len(valid)}", file=sys.stderr)
+    
+    # Enhanced post-processing with better image handling
+    for i, item in enumerate(valid):
+        if isinstance(item, dict):
+            item["guid"] = url
+            item["url"] = url
+            
+            # Get the original source text for this item
+            source_text = item.get("_source_text", "")
+            source_images = item.get("_source_images", [])
+            
+            # Process pricing
+            valid[i] = merge_price_fields(item, source_text)
+            print(f"[debug] Final price for item {i+1}: {valid[i].get('price_display')}", file=sys.stderr)
+            valid[i] = enrich_free_price_fields(valid[i])
+
+
+            # Process address
+            # The item's own text first, then the page line for a postcode it mentions, then the page address
+            own_adr = extract_full_address(source_text) or doc.addresses.lookup(source_text)
+            adr = own_adr or doc.addresses.page_address
+            if adr: 
+                item["address_display"] = adr
+                if not own_adr:
+                    # Usually the organiser's footer on listing pages: location.py geocodes the venue instead
+                    item["address_source"] = "page"
+            else: 
+                item["address_display"] = "Not Available"
+
+            # Process operating hours
+            date_time = extract_operating_hours(source_text)
+            if date_time and not item.get("datetime_display"):
+                item["datetime_display"] = date_time
+
+            # FIXED IMAGE HANDLING
+            current_images = item.get("images", [])
+            
+            # If item has no images or empty images, assign from source
+            if not current_images or (isinstance(current_images, list) and len(current_images) == 0):
+                print(f"[debug] Item {i+1} has no images, assigning from source", file=sys.stderr)
                 
-                # If item has no images or empty images, assign from source
-                if not current_images or (isinstance(current_images, list) and len(current_images) == 0):
-                    print(f"[debug] Item {i+1} has no images, assigning from source", file=sys.stderr)
-                    
-                    # Use images from the specific source that generated this item
-                    if source_images:
-                        organiser = item.get("organiser", item.get("venue_name", "Unknown"))
-                        item["images"] = [
-                            {"url": img_url, "source_credit": organiser} 
-                            for img_url in source_images[:3]  # Max 3 images per item
-                        ]
-                        print(f"[debug] Assigned {len(item['images'])} images from source to item {i+1}", file=sys.stderr)
-                    
-                    # If still no images, use fallback images
-                    elif fallback_images:
-                        organiser = item.get("organiser", item.get("venue_name", "Unknown"))
-                        # Rotate through fallback images to avoid all items having the same image
-                        start_idx = i % len(fallback_images)
-                        selected_fallbacks = fallback_images[start_idx:start_idx+2]  # Max 2 fallback images
-                        if len(selected_fallbacks) < 2 and len(fallback_images) > 1:
-                            selected_fallbacks.extend(fallback_images[:2-len(selected_fallbacks)])
-                        
-                        item["images"] = [
-                            {"url": img_url, "source_credit": organiser} 
-                            for img_url in selected_fallbacks
-                        ]
-                        print(f"[debug] Assigned {len(item['images'])} fallback images to item {i+1}", file=sys.stderr)
-                    else:
-                        item["images"] = []
-                        print(f"[debug] No images available for item {i+1}", file=sys.stderr)
+                # Use images from the specific source that generated this item
+                if source_images:
+                    organiser = item.get("organiser", item.get("venue_name", "Unknown"))
+                    item["images"] = [
+                        {"url": img_url, "source_credit": organiser} 
+                        for img_url in source_images[:3]  # Max 3 images per item
+                    ]
+                    print(f"[debug] Assigned {len(item['images'])} images from source to item {i+1}", file=sys.stderr)
                 
-                # Ensure images are in correct format
-                elif isinstance(current_images, list):
-                    formatted_images = []
+                # If still no images, use fallback images
+                elif fallback_images:
                     organiser = item.get("organiser", item.get("venue_name", "Unknown"))
+                    # Rotate through fallback images to avoid all items having the same image
+                    start_idx = i % len(fallback_images)
+                    selected_fallbacks = fallback_images[start_idx:start_idx+2]  # Max 2 fallback images
+                    if len(selected_fallbacks) < 2 and len(fallback_images) > 1:
+                        selected_fallbacks.extend(fallback_images[:2-len(selected_fallbacks)])
                     
-                    for img in current_images:
-                        if isinstance(img, str):
-                            # Convert string URL to object format
-                            formatted_images.append({"url": img, "source_credit": organiser})
-                        elif isinstance(img, dict) and img.get("url"):
-                            # Already in correct format, but ensure source_credit exists
-                            if not img.get("source_credit"):
-                                img["source_credit"] = organiser
-                            formatted_images.append(img)
-                    
-                    item["images"] = formatted_images
-                    print(f"[debug] Formatted {len(formatted_images)} existing images for item {i+1}", file=sys.stderr)
+                    item["images"] = [
+                        {"url": img_url, "source_credit": organiser} 
+                        for img_url in selected_fallbacks
+                    ]
+                    print(f"[debug] Assigned {len(item['images'])} fallback images to item {i+1}", file=sys.stderr)
+                else:
+                    item["images"] = []
+                    print(f"[debug] No images available for item {i+1}", file=sys.stderr)
+            
+            # Ensure images are in correct format
+            elif isinstance(current_images, list):
+                formatted_images = []
+                organiser = item.get("organiser", item.get("venue_name", "Unknown"))
+                
+                for img in current_images:
+                    if isinstance(img, str):
+                        # Convert string URL to object format
+                        formatted_images.append({"url": img, "source_credit": organiser})
+                    elif isinstance(img, dict) and img.get("url"):
+                        # Already in correct format, but ensure source_credit exists
+                        if not img.get("source_credit"):
+                            img["source_credit"] = organiser
+                        formatted_images.append(img)
+                
+                item["images"] = formatted_images
+                print(f"[debug] Formatted {len(formatted_images)} existing images for item {i+1}", file=sys.stderr)
 
-                # Clean up temporary fields
-                for temp_field in ["_source_type", "_source_index", "_source_images", "_source_text"]:
-                    item.pop(temp_field, None)
+            # Clean up temporary fields
+            for temp_field in ["_source_type", "_source_index", "_source_images", "_source_text", "_card"]:
+                item.pop(temp_field, None)
 
-        # Final validation
-        print(f"[debug] Final validation: {len(valid)} items", file=sys.stderr)
-        for i, item in enumerate(valid):
-            img_count = len(item.get("images", []))
-            venue_name = item.get("venue_name", "Unknown")
-            print(f"[debug] Item {i+1} ({venue_name}): {img_count} images", file=sys.stderr)
+    # Final validation
+    print(f"[debug] Final validation: {len(valid)} items", file=sys.stderr)
+    for i, item in enumerate(valid):
+        img_count = len(item.get("images", []))
+        venue_name = item.get("venue_name", "Unknown")
+        print(f"[debug] Item {i+1} ({venue_name}): {img_count} images", file=sys.stderr)
 
-        #GIVING UNIQUE ID
+    return valid
+
+
+_ID_LOCK = threading.Lock()
+
+def reserve_ids(count: int) -> int:
+    """Claim `count` consecutive ids from the tracker and return the first one."""
+    with _ID_LOCK:
         starting_id = load_id() + 1
-        for idx, item in enumerate(valid,start=starting_id):
-            item["id"] = idx
-        image_dir = PROJECT_ROOT / "valid_data" / "November" /"19Nov"/"images"
-        download_images(valid, image_dir)
-        out_path = PROJECT_ROOT / "valid_data" / "November" /"19Nov"/"countdown_1.json"
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-
-        json_output = json.dumps(valid, ensure_ascii=False, indent=2)
-        print(f"[debug] Writing {len(json_output)} chars to {out_path}", file=sys.stderr)
-
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(json_output)
-        
-        if valid:
-            save_id(valid[-1]["id"])
+        if count:
+            save_id(starting_id + count - 1)
+        return starting_id
+
+def save_items(valid: list[dict], out_path: Path, image_dir: Path) -> str:
+    """Assign ids, download images and write the items to `out_path`; returns the JSON text."""
+    #GIVING UNIQUE ID
+    starting_id = reserve_ids(len(valid))
+    for idx, item in enumerate(valid,start=starting_id):
+        item["id"] = idx
+    download_images(valid, image_dir)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    json_output = json.dumps(valid, ensure_ascii=False, indent=2)
+    print(f"[debug] Writing {len(json_output)} chars to {out_path}", file=sys.stderr)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(json_output)
+
+    print(f"[debug] File written successfully. File size: {out_path.stat().st_size} bytes", file=sys.stderr)
+    return json_output
+
+OUTPUT_DIR = PROJECT_ROOT / "valid_data" / "November" /"19Nov"
+
+def main():
+    pool = make_browser_pool()
+    try:
+        url = sys.argv[1] if len(sys.argv) > 1 else input("Enter URL: ").strip()
+        if not url:
+            print("[]")
+            return
+
+        print(f"[debug] Fetching URL: {url}", file=sys.stderr)
+        html, blocks = fetch_page(url, pool)
+
+        print(f"[debug] HTML fetched, length: {len(html)} chars", file=sys.stderr)
 
-        print(f"[debug] File written successfully. File size: {out_path.stat().st_size} bytes", file=sys.stderr)
+        valid = extract_items(url, html, blocks)
+        json_output = save_items(valid, OUTPUT_DIR / "countdown_1.json", OUTPUT_DIR / "images")
         print(json_output)
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         print("[]")
+    finally:
+        pool.close()
+        IMAGE_DOWNLOADER.report()
+        IMAGE_DOWNLOADER.close()
+        close_image_store()
+        get_gemini_cache().report()
+        GOVERNOR.report()
+        if PREFIX_CACHE:
+            PREFIX_CACHE.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file